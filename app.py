@@ -1,11 +1,23 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+
 import streamlit as st
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from core.database import (
     carregar_dados_filtrados,
     carregar_opcoes_filtros,
     carregar_kpis,
     obter_metadados,
-    carregar_mapeamento_municipios
+    carregar_mapeamento_municipios,
+    carregar_mapeamento_cnae,
+    MAPEAMENTO_SITUACAO,
+    MAPEAMENTO_SITUACAO_REVERSO
 )
 
 # --- Configuração da Página Principal ---
@@ -15,23 +27,28 @@ st.set_page_config(
     page_icon="📊"
 )
 
-# --- Mapeamento de Situação Cadastral ---
-MAPEAMENTO_SITUACAO = {
-    1: 'Nula',
-    2: 'Ativa',
-    3: 'Suspensa',
-    4: 'Inapta',
-    8: 'Baixada'
-}
-
-MAPEAMENTO_SITUACAO_REVERSO = {v: k for k, v in MAPEAMENTO_SITUACAO.items()}
-
 # --- Inicialização do Estado da Sessão ---
 
 @st.cache_data(ttl=3600)
 def carregar_opcoes_iniciais():
     """Carrega apenas as opções para os filtros (RS e Ativa)."""
-    return carregar_opcoes_filtros()
+    opcoes = carregar_opcoes_filtros()
+
+    # Listas prontas para a sidebar: ordenar/mapear aqui (com cache) evita
+    # refazer sorted() e as conversões a cada rerun dos widgets
+    opcoes['lista_municipios'] = sorted(opcoes.get('municipios', []))
+    opcoes['lista_cnaes'] = sorted(str(c) for c in opcoes.get('cnaes', []))
+    opcoes['lista_situacoes'] = sorted(
+        MAPEAMENTO_SITUACAO[int(s)] for s in opcoes.get('situacoes', [])
+        if int(s) in MAPEAMENTO_SITUACAO
+    )
+
+    return opcoes
+
+@st.cache_data(ttl=3600)
+def carregar_kpis_cached():
+    """KPIs mudam no máximo uma vez por dia; evita ida ao banco a cada rerun."""
+    return carregar_kpis()
 
 def inicializar_estado():
     """Inicializa o estado da sessão."""
@@ -56,53 +73,151 @@ def inicializar_estado():
 
 # --- Função de Carregamento de Dados ---
 
-def carregar_dados():
-    """Carrega dados COM FILTROS aplicados no banco (RS e Ativa por padrão)."""
-    
-    # Municípios já vêm como nomes
-    municipios = st.session_state.municipio_selecionado if st.session_state.municipio_selecionado else None
-    
-    # Situações
-    situacoes = [MAPEAMENTO_SITUACAO_REVERSO[s] for s in st.session_state.situacao_selecionada] if st.session_state.situacao_selecionada else None
-    
-    # CNAEs
-    cnaes = st.session_state.cnae_selecionado if st.session_state.cnae_selecionado else None
-    
-    # Período
-    data_inicio = None
-    data_fim = None
-    if len(st.session_state.periodo_selecionado) == 2:
-        data_inicio, data_fim = st.session_state.periodo_selecionado
-    
-    with st.spinner("⚡ Carregando dados filtrados do banco (RS - Ativas)..."):
-        df = carregar_dados_filtrados(
-            municipios=municipios,
-            cnaes=cnaes,
-            situacoes=situacoes,
-            data_inicio=data_inicio,
-            data_fim=data_fim,
-            limit=2000000  # 2 milhões
-        )
-    
+# Snapshot Parquet da visão padrão (sem filtros): cold start vira uma leitura
+# colunar em vez de query de 2M linhas + pós-processamento
+CAMINHO_CACHE_PARQUET = 'dados/_cache.parquet'
+ARQUIVOS_LOOKUP = ('dados/municipios.csv', 'dados/codigos_cnae_2.csv')
+VALIDADE_CACHE_PARQUET = 24 * 3600  # segundos
+
+def _cache_parquet_valido() -> bool:
+    """Snapshot é válido se for recente e mais novo que os CSVs de lookup."""
+    try:
+        mtime = os.path.getmtime(CAMINHO_CACHE_PARQUET)
+    except OSError:
+        return False
+    if time.time() - mtime > VALIDADE_CACHE_PARQUET:
+        return False
+    return all(
+        mtime > os.path.getmtime(arquivo)
+        for arquivo in ARQUIVOS_LOOKUP if os.path.exists(arquivo)
+    )
+
+@st.cache_data(ttl=24 * 3600, persist="disk", max_entries=16)
+def carregar_dados_processados(municipios, cnaes, situacoes, data_inicio, data_fim):
+    """Consulta o banco e faz o pós-processamento, memoizado por combinação de filtros."""
+    sem_filtros = not (municipios or cnaes or situacoes or data_inicio or data_fim)
+
+    if sem_filtros and _cache_parquet_valido():
+        try:
+            df = pd.read_parquet(CAMINHO_CACHE_PARQUET)
+        except Exception:
+            df = None  # snapshot ilegível: segue para a consulta ao banco
+        if df is not None:
+            # Period não sobrevive ao Parquet; recalcula a partir do datetime64
+            df['mes_ano_situacao'] = df['data_situacao_cadastral'].dt.to_period('M')
+            return df
+
+    df = carregar_dados_filtrados(
+        municipios=list(municipios) if municipios else None,
+        cnaes=list(cnaes) if cnaes else None,
+        situacoes=list(situacoes) if situacoes else None,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        limit=2000000  # 2 milhões
+    )
+
     if df.empty:
         return df
-    
-    # Processamento
+
+    # Processamento: converte para datetime64 uma única vez, antes do dropna,
+    # para que o filtro de nulos rode sobre datetime64 e não sobre objetos Python
+    df['data_situacao_cadastral'] = pd.to_datetime(df['data_situacao_cadastral'], errors='coerce')
     df['situacao_cadastral'] = pd.to_numeric(df['situacao_cadastral'], errors='coerce')
-    df.dropna(subset=['data_situacao_cadastral', 'situacao_cadastral'], inplace=True)
+    df = df.dropna(subset=['data_situacao_cadastral', 'situacao_cadastral'])
     
     # CNAE
     if 'cnae' in df.columns:
-        df['cnae'] = df['cnae'].astype(str).fillna('N/A')
+        df['cnae'] = df['cnae'].astype(str).fillna('N/A').astype('category')
+        # Descrição construída por categoria — O(#códigos) lookups no dicionário
+        # em vez de um map por linha sobre milhões de strings
+        cnae_to_desc = carregar_mapeamento_cnae()
+        rotulos = np.array(
+            [cnae_to_desc.get(c, 'Descrição não informada') for c in df['cnae'].cat.categories],
+            dtype=object
+        )
+        rotulos_unicos, inverso = np.unique(rotulos, return_inverse=True)
+        df['cnae_descricao'] = pd.Categorical.from_codes(
+            inverso[df['cnae'].cat.codes], rotulos_unicos)
     
     # Colunas derivadas
-    df['data_situacao_cadastral'] = pd.to_datetime(df['data_situacao_cadastral'])
     df['ano_situacao'] = df['data_situacao_cadastral'].dt.year
     df['mes_ano_situacao'] = df['data_situacao_cadastral'].dt.to_period('M')
     df['situacao_cadastral_label'] = df['situacao_cadastral'].map(MAPEAMENTO_SITUACAO).fillna('Outra')
-    
+
+    # Colunas de alta repetição viram category: filtros/unique/value_counts
+    # passam a operar sobre códigos inteiros em vez de strings Python
+    for coluna in ('municipio', 'municipio_nome', 'cnae', 'cnae_descricao', 'situacao_cadastral_label'):
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+
+    if sem_filtros:
+        # Grava num temporário no mesmo diretório e renomeia por cima: o
+        # os.replace é atômico, então quem pegar o caminho rápido enquanto
+        # outra sessão grava nunca lê um Parquet pela metade
+        caminho_tmp = None
+        try:
+            fd, caminho_tmp = tempfile.mkstemp(
+                dir=os.path.dirname(CAMINHO_CACHE_PARQUET) or '.',
+                prefix='_cache_', suffix='.parquet.tmp')
+            os.close(fd)
+            df.drop(columns=['mes_ano_situacao']).to_parquet(
+                caminho_tmp, engine='pyarrow', compression='zstd')
+            os.replace(caminho_tmp, CAMINHO_CACHE_PARQUET)
+        except Exception:
+            # snapshot é só otimização; sem ele o fluxo normal continua
+            if caminho_tmp and os.path.exists(caminho_tmp):
+                try:
+                    os.remove(caminho_tmp)
+                except OSError:
+                    pass
+
     return df
 
+def materializar_df_filtrado(df):
+    """Grava o resultado filtrado como Parquet endereçado por conteúdo em /tmp.
+
+    A chave (hash do conteúdo) identifica o frame de forma estável para os
+    caches das páginas de relatório/buscador, e o artefato sobrevive a
+    sessões do mesmo servidor — o mesmo filtro não re-materializa nada.
+    """
+    # Period não hasheia/serializa; é derivado de data_situacao_cadastral
+    df_base = df.drop(columns=['mes_ano_situacao'], errors='ignore')
+    chave = hashlib.blake2b(
+        pd.util.hash_pandas_object(df_base, index=True).values.tobytes(),
+        digest_size=12
+    ).hexdigest()
+    caminho = f'/tmp/rfb_{chave}.parquet'
+    if not os.path.exists(caminho):
+        try:
+            df_base.to_parquet(caminho, engine='pyarrow', compression='zstd')
+        except Exception:
+            pass  # artefato é melhor-esforço; a chave continua válida
+    return chave
+
+def carregar_dados():
+    """Carrega dados COM FILTROS aplicados no banco (RS e Ativa por padrão)."""
+
+    # Tuplas (hasháveis) para a chave do cache: seleções repetidas reaproveitam
+    # o resultado memoizado sem nova ida ao banco
+    municipios = tuple(st.session_state.municipio_selecionado) or None
+    cnaes = tuple(st.session_state.cnae_selecionado) or None
+    situacoes = tuple(MAPEAMENTO_SITUACAO_REVERSO[s] for s in st.session_state.situacao_selecionada) or None
+
+    # Período
+    data_inicio = None
+    data_fim = None
+    if len(st.session_state.periodo_selecionado) == 2:
+        data_inicio, data_fim = st.session_state.periodo_selecionado
+
+    # Período igual ao intervalo completo não restringe nada: zera para que a
+    # visão padrão (sem filtros) caia no fast path de snapshot/cache
+    opcoes_atuais = st.session_state.opcoes_filtros
+    if (data_inicio, data_fim) == (opcoes_atuais.get('min_data'), opcoes_atuais.get('max_data')):
+        data_inicio = data_fim = None
+
+    with st.spinner("⚡ Carregando dados filtrados do banco (RS - Ativas)..."):
+        return carregar_dados_processados(municipios, cnaes, situacoes, data_inicio, data_fim)
+
 # === INICIALIZAÇÃO ===
 inicializar_estado()
 opcoes = st.session_state.opcoes_filtros
@@ -112,7 +227,7 @@ st.sidebar.header("🔍 Filtros Globais")
 st.sidebar.info("⚡ **Base:** RS - Empresas Ativas - Limite: 2M registros")
 
 # Filtro por Município (nomes)
-lista_municipios = sorted(opcoes.get('municipios', []))
+lista_municipios = opcoes.get('lista_municipios', [])
 st.session_state.municipio_selecionado = st.sidebar.multiselect(
     "Selecione o Município",
     options=lista_municipios,
@@ -120,18 +235,19 @@ st.session_state.municipio_selecionado = st.sidebar.multiselect(
     help="Municípios do Rio Grande do Sul"
 )
 
-# Filtro por CNAE
-lista_cnaes = sorted([str(c) for c in opcoes.get('cnaes', [])])
+# Filtro por CNAE (estado guarda o código cru; descrição só na exibição)
+lista_cnaes = opcoes.get('lista_cnaes', [])
+cnae_descricoes = carregar_mapeamento_cnae()
 st.session_state.cnae_selecionado = st.sidebar.multiselect(
     "Selecione o CNAE",
     options=lista_cnaes,
     default=st.session_state.cnae_selecionado,
+    format_func=lambda c: f"{c} - {cnae_descricoes.get(c, 'Descrição não informada')}",
     help="Códigos CNAE disponíveis"
 )
 
 # Filtro por Situação Cadastral
-lista_situacoes_cod = opcoes.get('situacoes', [])
-lista_situacoes = sorted([MAPEAMENTO_SITUACAO.get(int(s), 'Outra') for s in lista_situacoes_cod if int(s) in MAPEAMENTO_SITUACAO])
+lista_situacoes = opcoes.get('lista_situacoes', [])
 st.session_state.situacao_selecionada = st.sidebar.multiselect(
     "Selecione a Situação Cadastral",
     options=lista_situacoes,
@@ -169,6 +285,7 @@ if st.sidebar.button("🗑️ Limpar Filtros", use_container_width=True):
 if aplicar_filtros or 'df_filtrado' not in st.session_state:
     df_filtrado = carregar_dados()
     st.session_state.df_filtrado = df_filtrado
+    st.session_state.df_filtrado_key = materializar_df_filtrado(df_filtrado)
 else:
     df_filtrado = st.session_state.df_filtrado
 
@@ -189,7 +306,7 @@ st.markdown("""
 
 # KPIs
 st.subheader("📈 Indicadores Chave (RS - Ativas)")
-kpis = carregar_kpis()
+kpis = carregar_kpis_cached()
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
@@ -225,10 +342,16 @@ if not df_filtrado.empty:
     
     # Export
     if st.button("📥 Exportar Dados (CSV)"):
-        csv = df_filtrado.to_csv(index=False)
+        # Serialização em C via Arrow: evita a string Python gigante do to_csv
+        df_export = df_filtrado
+        if 'mes_ano_situacao' in df_export.columns:
+            # Period não tem equivalente Arrow; exporta como texto
+            df_export = df_export.assign(mes_ano_situacao=df_export['mes_ano_situacao'].astype(str))
+        buf = io.BytesIO()
+        pacsv.write_csv(pa.Table.from_pandas(df_export, preserve_index=False), buf)
         st.download_button(
             label="Download CSV",
-            data=csv,
+            data=buf.getvalue(),
             file_name="dados_rfb_rs_filtrados.csv",
             mime="text/csv"
         )
@@ -1,10 +1,25 @@
+import os
+
 import streamlit as st
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine, text
 from sqlalchemy.pool import QueuePool
 from typing import Optional, List, Tuple, Dict
 from datetime import date, datetime
 
+# ==================== MAPEAMENTO DE SITUAÇÃO CADASTRAL ====================
+
+MAPEAMENTO_SITUACAO = {
+    1: 'Nula',
+    2: 'Ativa',
+    3: 'Suspensa',
+    4: 'Inapta',
+    8: 'Baixada'
+}
+
+MAPEAMENTO_SITUACAO_REVERSO = {v: k for k, v in MAPEAMENTO_SITUACAO.items()}
+
 # ==================== CONNECTION POOLING ====================
 
 @st.cache_resource
@@ -23,14 +38,27 @@ def get_engine():
             f"{st.secrets['postgres']['port']}/"
             f"{st.secrets['postgres']['dbname']}"
         )
-        
+
+        # Tamanho do pool configurável por secrets/env: com vários usuários
+        # simultâneos (e as queries de filtro em paralelo) o padrão antigo
+        # de 5 conexões saturava e serializava as requisições
+        pool_size = int(
+            st.secrets.get('POSTGRES_POOL_SIZE', os.environ.get('POSTGRES_POOL_SIZE', 20))
+        )
+        max_overflow = int(
+            st.secrets.get('POSTGRES_MAX_OVERFLOW', os.environ.get('POSTGRES_MAX_OVERFLOW', 40))
+        )
+
         engine = create_engine(
             connection_string,
             poolclass=QueuePool,
-            pool_size=5,
-            max_overflow=10,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=30,
+            pool_use_lifo=True,  # reusa a conexão mais recente (pre_ping mais barato)
             pool_pre_ping=True,
             pool_recycle=3600,
+            query_cache_size=500,  # cache de statements compilados do SQLAlchemy
             echo=False
         )
         
@@ -47,28 +75,53 @@ def carregar_mapeamento_municipios() -> Dict[str, Dict[str, str]]:
     Carrega o CSV de municípios e retorna dicionários para mapeamento.
     
     Returns:
-        dict: {'codigo_para_nome': {}, 'nome_para_codigo': {}}
+        dict: {'codigo_para_nome': {}, 'codigo_int_para_nome': {}, 'nome_para_codigo': {}}
     """
     try:
-        df = pd.read_csv('dados/municipios.csv', sep=';', header=None, 
-                        names=['codigo', 'nome'], dtype={'codigo': str})
-        
+        df = pd.read_csv('dados/municipios.csv', sep=';', header=None,
+                        names=['codigo', 'nome'], dtype={'codigo': str},
+                        engine='pyarrow')
+
         # Remove zeros à esquerda dos códigos para compatibilidade
         df['codigo'] = df['codigo'].str.lstrip('0')
-        
+
         # Dicionário codigo -> nome
         codigo_para_nome = dict(zip(df['codigo'], df['nome']))
-        
+
+        # Variante com chave inteira: permite mapear a coluna numérica do
+        # banco direto com .map(), sem astype(str)/lstrip por linha
+        codigo_int_para_nome = {int(k): v for k, v in codigo_para_nome.items()}
+
         # Dicionário nome -> codigo
         nome_para_codigo = dict(zip(df['nome'], df['codigo']))
-        
+
         return {
             'codigo_para_nome': codigo_para_nome,
+            'codigo_int_para_nome': codigo_int_para_nome,
             'nome_para_codigo': nome_para_codigo
         }
     except Exception as e:
         st.error(f"Erro ao carregar mapeamento de municípios: {e}")
-        return {'codigo_para_nome': {}, 'nome_para_codigo': {}}
+        return {'codigo_para_nome': {}, 'codigo_int_para_nome': {}, 'nome_para_codigo': {}}
+
+@st.cache_data(ttl=86400, persist="disk")  # Sobrevive a restarts do servidor
+def carregar_mapeamento_cnae() -> Dict[str, str]:
+    """
+    Carrega o CSV de códigos CNAE e retorna um dicionário codigo -> descrição.
+
+    Returns:
+        dict: {codigo_cnae: descricao}
+    """
+    try:
+        df = pd.read_csv('dados/codigos_cnae_2.csv', sep=';',
+                        dtype=str, encoding='utf-8-sig', engine='pyarrow')
+        df.columns = ['cnae', 'descricao']
+
+        # Dicionário para lookup direto (mais barato que um merge)
+        return dict(zip(df['cnae'], df['descricao']))
+    except Exception as e:
+        st.error(f"Erro ao carregar mapeamento de CNAEs: {e}")
+        return {}
 
 # ==================== FUNÇÕES AUXILIARES DE DATA ====================
 
@@ -91,6 +144,133 @@ def date_para_yyyymmdd(data: date) -> str:
 
 # ==================== SOLUÇÃO 1 & 2: QUERIES FILTRADAS COM JOIN ====================
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def _tem_coluna_data_date() -> bool:
+    """
+    Verifica (com cache) se a coluna gerada data_situacao_date existe.
+    Criada por scripts/add_data_situacao_date.sql.
+    """
+    try:
+        engine = get_engine()
+        query = """
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+          AND table_name = 'estabelecimentos'
+          AND column_name = 'data_situacao_date'
+        """
+        return not pd.read_sql_query(query, engine).empty
+    except Exception:
+        return False
+
+def _montar_consulta_base(
+    municipios: Optional[List[str]] = None,
+    cnaes: Optional[List[str]] = None,
+    situacoes: Optional[List[int]] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    incluir_municipios_join: bool = False
+) -> Tuple[str, dict]:
+    """
+    Monta o FROM/WHERE compartilhado pelas queries filtradas (dados e agregações).
+    FILTRO PADRÃO: UF = 'RS' e situacao_cadastral = 2 (Ativa)
+
+    Args:
+        incluir_municipios_join: adiciona o JOIN com public.municipios para
+            resolver o nome do município no banco (requer o script
+            scripts/create_municipios_table.sql)
+
+    Returns:
+        tuple: (trecho SQL a partir do FROM, parâmetros para bind)
+    """
+    base = """
+        FROM public.estabelecimentos e
+        LEFT JOIN public.estabelecimento_cnaes ec
+          ON e.cnpj = ec.cnpj
+        """
+    if incluir_municipios_join:
+        base += """LEFT JOIN public.municipios m
+          ON m.codigo = e.municipio
+        """
+    # WHERE sempre parametrizado com guardas de NULL: o texto SQL é idêntico
+    # para qualquer combinação de filtros, então o Postgres reaproveita o
+    # plano (e o SQLAlchemy o statement compilado) em vez de re-planejar a
+    # cada mudança de filtro
+    base += """WHERE e.uf = 'RS'
+          AND e.situacao_cadastral = 2
+          AND e.data_situacao_cadastral IS NOT NULL
+          AND e.data_situacao_cadastral != '0'
+          AND ((:municipios)::int[] IS NULL OR e.municipio = ANY(:municipios))
+          AND ((:cnaes)::text[] IS NULL OR ec.cnae = ANY(:cnaes))
+          AND ((:situacoes)::int[] IS NULL OR e.situacao_cadastral = ANY(:situacoes))
+        """
+
+    # Filtro de data: usa a coluna DATE gerada (indexada) quando disponível
+    # OBS: o bind fica entre parênteses antes do cast — ':param::tipo' confunde
+    # o parser de binds do text() e vazaria ':param' literal para o driver
+    if _tem_coluna_data_date():
+        base += "  AND ((:data_inicio)::date IS NULL OR e.data_situacao_date BETWEEN :data_inicio AND :data_fim)\n        "
+    else:
+        base += "  AND ((:data_inicio)::text IS NULL OR e.data_situacao_cadastral::text BETWEEN :data_inicio AND :data_fim)\n        "
+
+    # Converter nomes de municípios para códigos
+    codigos_municipios = None
+    if municipios and len(municipios) > 0:
+        nome_para_codigo = carregar_mapeamento_municipios()['nome_para_codigo']
+        codigos_municipios = [
+            int(codigo) for nome in municipios
+            if (codigo := nome_para_codigo.get(nome))
+        ] or None
+
+    if data_inicio and data_fim:
+        if _tem_coluna_data_date():
+            param_data_inicio, param_data_fim = data_inicio, data_fim
+        else:
+            param_data_inicio = date_para_yyyymmdd(data_inicio)
+            param_data_fim = date_para_yyyymmdd(data_fim)
+    else:
+        param_data_inicio = param_data_fim = None
+
+    # Filtros ausentes viram NULL no bind — a guarda correspondente desliga
+    # a condição sem mudar o texto da query
+    params = {
+        'municipios': codigos_municipios,
+        'cnaes': list(cnaes) if cnaes else None,
+        'situacoes': list(situacoes) if situacoes else None,
+        'data_inicio': param_data_inicio,
+        'data_fim': param_data_fim,
+    }
+
+    return base, params
+
+def filtros_da_sessao() -> dict:
+    """
+    Lê os filtros globais do session_state como argumentos hasháveis,
+    prontos para as funções de agregação cacheadas.
+    """
+    municipios = tuple(st.session_state.get('municipio_selecionado') or ()) or None
+    cnaes = tuple(st.session_state.get('cnae_selecionado') or ()) or None
+    situacoes = tuple(
+        MAPEAMENTO_SITUACAO_REVERSO[s]
+        for s in (st.session_state.get('situacao_selecionada') or ())
+        if s in MAPEAMENTO_SITUACAO_REVERSO
+    ) or None
+
+    data_inicio = None
+    data_fim = None
+    periodo = st.session_state.get('periodo_selecionado') or ()
+    if len(periodo) == 2:
+        data_inicio, data_fim = periodo
+
+    return {
+        'municipios': municipios,
+        'cnaes': cnaes,
+        'situacoes': situacoes,
+        'data_inicio': data_inicio,
+        'data_fim': data_fim
+    }
+
+@st.cache_data(ttl=600, show_spinner=False)
 def carregar_dados_filtrados(
     municipios: Optional[List[str]] = None,
     cnaes: Optional[List[str]] = None,
@@ -116,83 +296,266 @@ def carregar_dados_filtrados(
     """
     try:
         engine = get_engine()
-        mapeamento = carregar_mapeamento_municipios()
-        nome_para_codigo = mapeamento['nome_para_codigo']
-        codigo_para_nome = mapeamento['codigo_para_nome']
-        
-        # Query base com filtro FIXO para RS e Ativa
-        query = """
+
+        def _ler_em_lotes(query: str, params: dict) -> pd.DataFrame:
+            # Fetch em lotes com strings Arrow: limita o pico de memória e
+            # strings pyarrow ocupam ~1/3 das strings object
+            lotes = list(pd.read_sql_query(
+                text(query), engine, params=params,
+                chunksize=200000, dtype_backend='pyarrow'
+            ))
+            if not lotes:
+                return pd.DataFrame()
+            return pd.concat(lotes, ignore_index=True, copy=False)
+
+        # Tenta resolver o nome do município via JOIN no banco
+        colunas = """
         SELECT e.cnpj AS cnpj_basico,
                e.situacao_cadastral,
                e.data_situacao_cadastral,
                e.municipio,
-               e.uf,
-               ec.cnae
-        FROM public.estabelecimentos e
-        LEFT JOIN public.estabelecimento_cnaes ec
-          ON e.cnpj = ec.cnpj
-        WHERE e.uf = 'RS'
-          AND e.situacao_cadastral = 2
-          AND e.data_situacao_cadastral IS NOT NULL
-          AND e.data_situacao_cadastral != '0'
         """
-        
-        params = {}
-        
-        # Converter nomes de municípios para códigos
-        if municipios and len(municipios) > 0:
-            codigos_municipios = []
-            for nome in municipios:
-                codigo = nome_para_codigo.get(nome)
-                if codigo:
-                    codigos_municipios.append(int(codigo))
-            
-            if codigos_municipios:
-                query += " AND e.municipio = ANY(:municipios)"
-                params['municipios'] = codigos_municipios
-        
-        # Filtro de CNAEs
-        if cnaes and len(cnaes) > 0:
-            query += " AND ec.cnae = ANY(:cnaes)"
-            params['cnaes'] = cnaes
-        
-        # Filtro adicional de situações (caso queira filtrar além da Ativa)
-        if situacoes and len(situacoes) > 0:
-            query += " AND e.situacao_cadastral = ANY(:situacoes)"
-            params['situacoes'] = situacoes
-        
-        # Filtro de data
-        if data_inicio and data_fim:
-            data_inicio_yyyymmdd = date_para_yyyymmdd(data_inicio)
-            data_fim_yyyymmdd = date_para_yyyymmdd(data_fim)
-            query += " AND e.data_situacao_cadastral::text BETWEEN :data_inicio AND :data_fim"
-            params['data_inicio'] = data_inicio_yyyymmdd
-            params['data_fim'] = data_fim_yyyymmdd
-        
-        query += " LIMIT :limit"
-        params['limit'] = limit
-        
-        df = pd.read_sql_query(text(query), engine, params=params)
+        df = None
+        try:
+            base, params = _montar_consulta_base(
+                municipios, cnaes, situacoes, data_inicio, data_fim,
+                incluir_municipios_join=True
+            )
+            query = colunas + "       m.nome AS municipio_nome,\n               ec.cnae\n" + base + " LIMIT :limit"
+            params['limit'] = limit
+            df = _ler_em_lotes(query, params)
+        except Exception:
+            pass  # tabela public.municipios ainda não criada
+
+        if df is None:
+            # Fallback: query sem JOIN + mapeamento código -> nome no pandas
+            base, params = _montar_consulta_base(municipios, cnaes, situacoes, data_inicio, data_fim)
+            query = colunas + "       ec.cnae\n" + base + " LIMIT :limit"
+            params['limit'] = limit
+            df = _ler_em_lotes(query, params)
         
         # Pós-processamento
         if not df.empty and 'data_situacao_cadastral' in df.columns:
-            df['data_situacao_cadastral'] = df['data_situacao_cadastral'].apply(
-                lambda x: converter_yyyymmdd_para_date(str(x))
+            # Parse vetorizado em C: evita chamar strptime linha a linha
+            df['data_situacao_cadastral'] = pd.to_datetime(
+                df['data_situacao_cadastral'].astype('string'),
+                format='%Y%m%d', errors='coerce'
             )
-            df = df[df['data_situacao_cadastral'].notna()]
+            df = df.dropna(subset=['data_situacao_cadastral'])
             
-            # Adicionar nome do município
-            df['municipio_nome'] = df['municipio'].astype(str).str.lstrip('0').map(codigo_para_nome)
+            # Nome do município: vem do JOIN quando a tabela existe;
+            # senão, mapeia código -> nome no pandas
+            if 'municipio_nome' not in df.columns:
+                # Chaves inteiras: mapeia a coluna numérica do banco direto,
+                # sem materializar astype(str)/lstrip linha a linha
+                codigo_int_para_nome = carregar_mapeamento_municipios()['codigo_int_para_nome']
+                df['municipio_nome'] = df['municipio'].map(codigo_int_para_nome)
             df['municipio_nome'] = df['municipio_nome'].fillna('Município ' + df['municipio'].astype(str))
-        
+
         return df
-        
+
     except Exception as e:
         st.error(f"❌ Erro ao carregar dados filtrados: {e}")
         import traceback
         st.code(traceback.format_exc())
         return pd.DataFrame()
 
+def carregar_dados_filtrados_iter(
+    municipios: Optional[List[str]] = None,
+    cnaes: Optional[List[str]] = None,
+    situacoes: Optional[List[int]] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    tamanho_lote: int = 50000
+):
+    """
+    ⚡ Versão streaming de carregar_dados_filtrados: usa cursor do lado do
+    servidor (stream_results) e gera o resultado em lotes, sem materializar
+    o rowset inteiro nem depender de um LIMIT gigante.
+
+    Yields:
+        pd.DataFrame: lotes de até tamanho_lote registros
+    """
+    try:
+        engine = get_engine()
+        base, params = _montar_consulta_base(municipios, cnaes, situacoes, data_inicio, data_fim)
+
+        query = """
+        SELECT e.cnpj AS cnpj_basico,
+               e.situacao_cadastral,
+               e.data_situacao_cadastral,
+               e.municipio,
+               ec.cnae
+        """ + base
+
+        with engine.connect() as conn:
+            resultado = conn.execution_options(
+                stream_results=True, yield_per=tamanho_lote
+            ).execute(text(query), params)
+
+            for particao in resultado.partitions(tamanho_lote):
+                yield pd.DataFrame(particao, columns=resultado.keys())
+
+    except Exception as e:
+        st.error(f"❌ Erro ao iterar dados filtrados: {e}")
+        return
+
+# ==================== AGREGAÇÕES NO BANCO (GROUP BY) ====================
+
+@st.cache_data(ttl=600, show_spinner=False)
+def carregar_evolucao_mensal(
+    municipios=None, cnaes=None, situacoes=None, data_inicio=None, data_fim=None
+) -> pd.DataFrame:
+    """
+    ⚡ Evolução mensal por situação agregada no banco.
+    Retorna ~centenas de linhas (mes_ano, situação, quantidade) em vez de
+    transferir milhões de registros para agrupar no pandas.
+    """
+    try:
+        engine = get_engine()
+        base, params = _montar_consulta_base(municipios, cnaes, situacoes, data_inicio, data_fim)
+
+        query = """
+        SELECT SUBSTRING(e.data_situacao_cadastral::text, 1, 6) AS mes_ano,
+               e.situacao_cadastral,
+               COUNT(*) AS quantidade
+        """ + base + """
+        GROUP BY 1, 2
+        ORDER BY 1
+        """
+
+        df = pd.read_sql_query(text(query), engine, params=params)
+
+        if not df.empty:
+            df['mes_ano'] = pd.to_datetime(df['mes_ano'], format='%Y%m', errors='coerce')
+            df = df.dropna(subset=['mes_ano'])
+            df['ano'] = df['mes_ano'].dt.year
+            df['situacao_cadastral_label'] = (
+                pd.to_numeric(df['situacao_cadastral'], errors='coerce')
+                .map(MAPEAMENTO_SITUACAO).fillna('Outra')
+            )
+
+        return df
+
+    except Exception as e:
+        st.error(f"❌ Erro ao carregar evolução mensal: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(ttl=600, show_spinner=False)
+def carregar_distribuicao_status(
+    municipios=None, cnaes=None, situacoes=None, data_inicio=None, data_fim=None
+) -> pd.DataFrame:
+    """
+    ⚡ Distribuição por situação cadastral agregada no banco.
+    """
+    try:
+        engine = get_engine()
+        base, params = _montar_consulta_base(municipios, cnaes, situacoes, data_inicio, data_fim)
+
+        query = """
+        SELECT e.situacao_cadastral,
+               COUNT(*) AS quantidade
+        """ + base + """
+        GROUP BY 1
+        ORDER BY quantidade DESC
+        """
+
+        df = pd.read_sql_query(text(query), engine, params=params)
+
+        if not df.empty:
+            df['situacao_cadastral_label'] = (
+                pd.to_numeric(df['situacao_cadastral'], errors='coerce')
+                .map(MAPEAMENTO_SITUACAO).fillna('Outra')
+            )
+
+        return df
+
+    except Exception as e:
+        st.error(f"❌ Erro ao carregar distribuição de status: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(ttl=600, show_spinner=False)
+def carregar_top_cnaes(
+    municipios=None, cnaes=None, situacoes=None, data_inicio=None, data_fim=None, n: int = 15
+) -> pd.DataFrame:
+    """
+    ⚡ Top N CNAEs por número de empresas, agregado no banco.
+    """
+    try:
+        engine = get_engine()
+        base, params = _montar_consulta_base(municipios, cnaes, situacoes, data_inicio, data_fim)
+
+        query = """
+        SELECT ec.cnae,
+               COUNT(*) AS quantidade
+        """ + base + """
+          AND ec.cnae IS NOT NULL
+        GROUP BY ec.cnae
+        ORDER BY quantidade DESC
+        LIMIT :n
+        """
+        params['n'] = n
+
+        return pd.read_sql_query(text(query), engine, params=params)
+
+    except Exception as e:
+        st.error(f"❌ Erro ao carregar top CNAEs: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(ttl=600, show_spinner=False)
+def carregar_empresas_por_municipio(
+    municipios=None, cnaes=None, situacoes=None, data_inicio=None, data_fim=None
+) -> pd.DataFrame:
+    """
+    ⚡ Contagem de empresas por município (com os filtros globais), agregada no banco.
+    """
+    try:
+        engine = get_engine()
+
+        df = None
+        try:
+            base, params = _montar_consulta_base(
+                municipios, cnaes, situacoes, data_inicio, data_fim,
+                incluir_municipios_join=True
+            )
+            query = """
+            SELECT e.municipio,
+                   m.nome AS municipio_nome,
+                   COUNT(*) AS quantidade
+            """ + base + """
+            GROUP BY e.municipio, m.nome
+            ORDER BY quantidade DESC
+            """
+            df = pd.read_sql_query(text(query), engine, params=params)
+        except Exception:
+            pass  # tabela public.municipios ainda não criada
+
+        if df is None:
+            base, params = _montar_consulta_base(municipios, cnaes, situacoes, data_inicio, data_fim)
+            query = """
+            SELECT e.municipio,
+                   COUNT(*) AS quantidade
+            """ + base + """
+            GROUP BY e.municipio
+            ORDER BY quantidade DESC
+            """
+            df = pd.read_sql_query(text(query), engine, params=params)
+
+        if not df.empty:
+            if 'municipio_nome' not in df.columns:
+                # Chaves inteiras: mapeia a coluna numérica do banco direto,
+                # sem materializar astype(str)/lstrip linha a linha
+                codigo_int_para_nome = carregar_mapeamento_municipios()['codigo_int_para_nome']
+                df['municipio_nome'] = df['municipio'].map(codigo_int_para_nome)
+            df['municipio_nome'] = df['municipio_nome'].fillna('Município ' + df['municipio'].astype(str))
+
+        return df
+
+    except Exception as e:
+        st.error(f"❌ Erro ao carregar empresas por município: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(ttl=600, show_spinner=False)
 def carregar_opcoes_filtros() -> dict:
     """
     ⚡ OTIMIZADO: Carrega apenas as opções únicas para os filtros.
@@ -204,18 +567,26 @@ def carregar_opcoes_filtros() -> dict:
     try:
         engine = get_engine()
         mapeamento = carregar_mapeamento_municipios()
-        codigo_para_nome = mapeamento['codigo_para_nome']
+        codigo_int_para_nome = mapeamento['codigo_int_para_nome']
         
         # Filtro base para RS e Ativa
         filtro_base = "WHERE uf = 'RS' AND situacao_cadastral = 2"
-        
+
+        # Materialized views (scripts/create_filter_options_mvs.sql): os
+        # conjuntos distintos só mudam na carga da RFB, então a leitura
+        # preferencial é das MVs pequenas, com fallback para a tabela de fatos
+        query_municipios_mv = "SELECT municipio FROM public.mv_filtro_municipios_rs"
+        query_cnaes_mv = "SELECT cnae FROM public.mv_filtro_cnaes_rs ORDER BY cnae"
+        query_datas_mv = "SELECT min_data, max_data FROM public.mv_filtro_datas_rs LIMIT 1"
+
         # Query de municípios com filtro
+        # Sem ORDER BY: a ordenação por código seria descartada, pois a lista
+        # final é ordenada uma única vez pelo NOME do município
         query_municipios = f"""
         SELECT DISTINCT municipio
         FROM public.estabelecimentos
         {filtro_base}
         AND municipio IS NOT NULL
-        ORDER BY municipio
         LIMIT 1000
         """
         
@@ -239,27 +610,51 @@ def carregar_opcoes_filtros() -> dict:
         """
         
         # Query de datas
-        query_datas = f"""
-        SELECT
-          MIN(data_situacao_cadastral::text) AS min_data,
-          MAX(data_situacao_cadastral::text) AS max_data
-        FROM public.estabelecimentos
-        {filtro_base}
-        AND data_situacao_cadastral IS NOT NULL
-        AND LENGTH(data_situacao_cadastral::text) = 8
-        AND data_situacao_cadastral::text ~ '^[0-9]{8}$'
-        """
-        
-        df_municipios = pd.read_sql_query(query_municipios, engine)
-        df_cnaes = pd.read_sql_query(query_cnaes, engine)
-        df_situacoes = pd.read_sql_query(query_situacoes, engine)
-        df_datas = pd.read_sql_query(query_datas, engine)
+        if _tem_coluna_data_date():
+            # Coluna DATE gerada: MIN/MAX indexados, sem regex/cast por linha
+            query_datas = f"""
+            SELECT
+              MIN(data_situacao_date) AS min_data,
+              MAX(data_situacao_date) AS max_data
+            FROM public.estabelecimentos
+            {filtro_base}
+            AND data_situacao_date IS NOT NULL
+            """
+        else:
+            query_datas = f"""
+            SELECT
+              MIN(data_situacao_cadastral::text) AS min_data,
+              MAX(data_situacao_cadastral::text) AS max_data
+            FROM public.estabelecimentos
+            {filtro_base}
+            AND data_situacao_cadastral IS NOT NULL
+            AND LENGTH(data_situacao_cadastral::text) = 8
+            AND data_situacao_cadastral::text ~ '^[0-9]{{8}}$'
+            """
+        
+        def _ler_com_fallback(query_mv: str, query_fato: str) -> pd.DataFrame:
+            try:
+                return pd.read_sql_query(query_mv, engine)
+            except Exception:
+                return pd.read_sql_query(query_fato, engine)
+
+        # Quatro queries independentes em paralelo (engine com QueuePool é
+        # thread-safe): latência total vira max(t_i) em vez de sum(t_i)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futuro_municipios = executor.submit(_ler_com_fallback, query_municipios_mv, query_municipios)
+            futuro_cnaes = executor.submit(_ler_com_fallback, query_cnaes_mv, query_cnaes)
+            futuro_situacoes = executor.submit(pd.read_sql_query, query_situacoes, engine)
+            futuro_datas = executor.submit(_ler_com_fallback, query_datas_mv, query_datas)
+
+            df_municipios = futuro_municipios.result()
+            df_cnaes = futuro_cnaes.result()
+            df_situacoes = futuro_situacoes.result()
+            df_datas = futuro_datas.result()
         
-        # Converter códigos de municípios para nomes
+        # Converter códigos de municípios para nomes (lookup por inteiro)
         municipios_nomes = []
         for codigo in df_municipios['municipio']:
-            codigo_str = str(codigo).lstrip('0')
-            nome = codigo_para_nome.get(codigo_str, f"Código {codigo}")
+            nome = codigo_int_para_nome.get(int(codigo), f"Código {codigo}")
             municipios_nomes.append(nome)
         
         municipios_nomes = sorted(set(municipios_nomes))
@@ -270,8 +665,13 @@ def carregar_opcoes_filtros() -> dict:
         if not df_datas.empty:
             min_data_str = df_datas['min_data'].iloc[0]
             max_data_str = df_datas['max_data'].iloc[0]
-            min_data = converter_yyyymmdd_para_date(min_data_str)
-            max_data = converter_yyyymmdd_para_date(max_data_str)
+            if isinstance(min_data_str, date):
+                # Coluna DATE gerada já devolve objetos date
+                min_data = min_data_str
+                max_data = max_data_str
+            else:
+                min_data = converter_yyyymmdd_para_date(min_data_str)
+                max_data = converter_yyyymmdd_para_date(max_data_str)
         
         return {
             'municipios': municipios_nomes,
@@ -295,6 +695,7 @@ def carregar_opcoes_filtros() -> dict:
 
 # ==================== SOLUÇÃO 4: MATERIALIZED VIEWS ====================
 
+@st.cache_data(ttl=600, show_spinner=False)
 def carregar_kpis() -> dict:
     """
     ⚡ SUPER RÁPIDO: Carrega KPIs da materialized view.
@@ -358,6 +759,7 @@ def carregar_kpis() -> dict:
             'percent_ativas': 0
         }
 
+@st.cache_data(ttl=600, show_spinner=False)
 def carregar_agregacao_municipio() -> pd.DataFrame:
     """
     ⚡ SUPER RÁPIDO: Carrega agregação por município.
@@ -365,7 +767,22 @@ def carregar_agregacao_municipio() -> pd.DataFrame:
     """
     try:
         engine = get_engine()
-        
+
+        # Tenta resolver o nome via JOIN com public.municipios
+        query_join = """
+        SELECT
+          e.municipio,
+          m.nome AS municipio_nome,
+          COUNT(*) AS total_empresas,
+          SUM(CASE WHEN e.situacao_cadastral = 2 THEN 1 ELSE 0 END) AS empresas_ativas,
+          SUM(CASE WHEN e.situacao_cadastral = 8 THEN 1 ELSE 0 END) AS empresas_baixadas
+        FROM public.estabelecimentos e
+        LEFT JOIN public.municipios m ON m.codigo = e.municipio
+        WHERE e.uf = 'RS' AND e.municipio IS NOT NULL
+        GROUP BY e.municipio, m.nome
+        ORDER BY total_empresas DESC
+        """
+
         query_fallback = """
         SELECT
           municipio,
@@ -377,16 +794,21 @@ def carregar_agregacao_municipio() -> pd.DataFrame:
         GROUP BY municipio
         ORDER BY total_empresas DESC
         """
-        
-        df = pd.read_sql_query(query_fallback, engine)
-        
-        # Adicionar nomes dos municípios
+
+        try:
+            df = pd.read_sql_query(query_join, engine)
+        except Exception:
+            df = pd.read_sql_query(query_fallback, engine)
+
+        # Adicionar nomes dos municípios (fallback em Python)
         if not df.empty:
-            mapeamento = carregar_mapeamento_municipios()
-            codigo_para_nome = mapeamento['codigo_para_nome']
-            df['municipio_nome'] = df['municipio'].astype(str).str.lstrip('0').map(codigo_para_nome)
+            if 'municipio_nome' not in df.columns:
+                # Chaves inteiras: mapeia a coluna numérica do banco direto,
+                # sem materializar astype(str)/lstrip linha a linha
+                codigo_int_para_nome = carregar_mapeamento_municipios()['codigo_int_para_nome']
+                df['municipio_nome'] = df['municipio'].map(codigo_int_para_nome)
             df['municipio_nome'] = df['municipio_nome'].fillna('Município ' + df['municipio'].astype(str))
-        
+
         return df
         
     except Exception as e:
@@ -406,11 +828,27 @@ def testar_conexao() -> bool:
         st.error(f"❌ Erro ao testar conexão: {e}")
         return False
 
+@st.cache_data(ttl=600, show_spinner=False)
 def obter_metadados() -> dict:
     """Carrega metadados rápidos do banco (filtrado para RS)."""
     try:
         engine = get_engine()
-        
+
+        # Tenta a materialized view primeiro (scripts/create_metadados_mv.sql):
+        # uma linha pré-computada em vez do COUNT(DISTINCT) com join
+        query_mv = """
+        SELECT total_registros, total_municipios, total_cnaes
+        FROM public.mv_metadados_rs
+        LIMIT 1
+        """
+
+        try:
+            df_mv = pd.read_sql_query(query_mv, engine)
+            if not df_mv.empty:
+                return df_mv.iloc[0].to_dict()
+        except:
+            pass
+
         query = """
         SELECT
           COUNT(*) AS total_registros,
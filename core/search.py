@@ -1,22 +1,103 @@
 # core/search.py
 
+import functools
+import re
 import time
+import threading
 import unicodedata
-from typing import Dict, List, Set, Tuple, Any
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple, Any
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from ddgs import DDGS
 
 # --- Constantes de Configuração ---
 # Boa prática: Centralizar configurações facilita a manutenção.
-NUM_THREADS = 4             # Número de buscas paralelas. Ajuste conforme a capacidade da sua máquina.
-TEMPO_ESPERA = 1            # Pausa em segundos entre as requisições para evitar bloqueios.
+NUM_THREADS = 16            # Número de buscas paralelas. Buscas são I/O-bound, então vale mais que o nº de CPUs.
+BUSCAS_POR_SEGUNDO = 8      # Teto global de requisições por segundo para evitar bloqueios.
 MAX_RESULTS_PER_SEARCH = 3  # Quantos resultados do Google analisar por empresa.
 VALIDATION_THRESHOLD = 0.2  # Quão "parecido" o resultado da busca deve ser com os dados da empresa.
 
+# Constantes da extração de palavras-chave, criadas uma única vez no import
+# (antes eram reconstruídas a cada empresa do lote).
+# Colunas que contêm informações valiosas para identificar a empresa
+_CAMPOS_TEXTO = (
+    'cnpj_basico', 'situacao_cadastral', 'data_situacao_cadastral',
+    'cnae_fiscal_principal', 'municipio', 'razao_social'
+)
+
+# Palavras genéricas que não ajudam na identificação
+_STOPWORDS = frozenset({
+    'ltda', 'cia', 'comercial', 'servicos', 'me', 'sa',
+    'empresa', 'rua', 'avenida', 'centro', 'bairro', 'com', 'br', 'gov'
+})
+
+# Colunas que o processamento do lote efetivamente lê — o chamador pode
+# projetar o DataFrame para estas antes de despachar, em vez de copiá-lo
+CAMPOS_BUSCA = _CAMPOS_TEXTO + ('municipio_nome',)
+
+# --- Limitador de vazão (janela deslizante) ---
+# Substitui o antigo sleep fixo por thread: em vez de cada worker dormir 1s
+# antes de toda busca, as threads só esperam quando a janela de 1s já tem
+# BUSCAS_POR_SEGUNDO requisições — threads ociosas não se bloqueiam entre si.
+_janela_lock = threading.Lock()
+_janela_buscas: deque = deque()
+
+
+def _aguardar_janela() -> None:
+    """Bloqueia até haver vaga na janela de 1 segundo de requisições."""
+    while True:
+        with _janela_lock:
+            agora = time.monotonic()
+            while _janela_buscas and agora - _janela_buscas[0] >= 1.0:
+                _janela_buscas.popleft()
+            if len(_janela_buscas) < BUSCAS_POR_SEGUNDO:
+                _janela_buscas.append(agora)
+                return
+            espera = 1.0 - (agora - _janela_buscas[0])
+        time.sleep(max(espera, 0.01))
+
+
+# --- Cliente de busca por thread ---
+# Criar um DDGS() novo a cada empresa refazia handshake TLS e resolução DNS
+# em toda busca; com threading.local cada worker mantém um cliente próprio e
+# reaproveita a conexão durante o lote inteiro.
+_clientes_locais = threading.local()
+
+
+def _obter_cliente_ddgs() -> DDGS:
+    """Retorna o cliente DDGS da thread atual, criando-o na primeira busca."""
+    cliente = getattr(_clientes_locais, 'ddgs', None)
+    if cliente is None:
+        cliente = DDGS(timeout=10)
+        _clientes_locais.ddgs = cliente
+    return cliente
+
 
 # ==================== Funções de Validação com Dados da RFB ====================
 
+# Só textos curtos passam pelo cache: descrições de resultado de busca
+# (título + corpo) são longas e praticamente únicas por resultado, então
+# cacheá-las só encheria o LRU de chaves que nunca repetem — e reteria
+# chave e valor de cada uma. Os campos que de fato reaparecem num lote
+# (nomes de empresa/cidade, descrições de CNAE) cabem folgados no limite.
+_TAMANHO_MAX_CACHE_NORMALIZACAO = 128
+
+
+def _normalizar_texto_bruto(texto: str) -> str:
+    # Decompõe caracteres acentuados (ex: 'á' -> 'a' + ´)
+    texto = unicodedata.normalize('NFD', texto)
+    return texto.lower().strip()
+
+
+@functools.lru_cache(maxsize=50_000)
+def _normalizar_texto_cached(texto: str) -> str:
+    """Normalização NFD + lowercase com cache: lotes grandes repetem muitos
+    tokens (nomes de cidade, descrições de CNAE), então a decomposição
+    unicode — o custo de CPU dominante da validação — roda uma vez só."""
+    return _normalizar_texto_bruto(texto)
+
+
 def normalizar_texto(texto: Any) -> str:
     """
     Normaliza texto para comparação (remove acentos, converte para minúsculo).
@@ -24,61 +105,83 @@ def normalizar_texto(texto: Any) -> str:
     """
     if pd.isna(texto):
         return ""
-    
+
     texto = str(texto)
-    # Decompõe caracteres acentuados (ex: 'á' -> 'a' + ´)
-    texto = unicodedata.normalize('NFD', texto)
-    
-    return texto.lower().strip()
+    if len(texto) > _TAMANHO_MAX_CACHE_NORMALIZACAO:
+        return _normalizar_texto_bruto(texto)
+    return _normalizar_texto_cached(texto)
 
-def extrair_palavras_chave(empresa_data: pd.Series) -> Set[str]:
+def extrair_palavras_chave(empresa_data: Dict[str, Any]) -> Set[str]:
     """
     Extrai um conjunto de palavras-chave relevantes de uma empresa para validação.
     Cria um "DNA" da empresa para comparar com os resultados da busca.
     # Boa prática: Centralizar a lógica de extração de palavras-chave.
     """
     palavras = set()
-    
-    # Colunas que contêm informações valiosas para identificar a empresa
-    campos_texto = [
-        'cnpj_basico','situacao_cadastral','data_situacao_cadastral',
-        'cnae_fiscal_principal','municipio','razao_social'
-    ]
-    
-    for campo in campos_texto:
+
+    for campo in _CAMPOS_TEXTO:
         # Verifica se a coluna existe e não é nula antes de processar
-        if campo in empresa_data and pd.notna(empresa_data[campo]):
+        # (NaN já virou None na conversão para dicts em buscar_em_lote)
+        if empresa_data.get(campo) is not None:
             valor = empresa_data[campo]
             if valor and str(valor).strip():
                 texto_normalizado = normalizar_texto(valor)
-                palavras_campo = {p for p in texto_normalizado.split() if len(p) >= 2}
-                palavras.update(palavras_campo)
-    
-    # Remove palavras genéricas que não ajudam na identificação
-    palavras_comuns = {
-        'ltda', 'cia', 'comercial', 'servicos', 'me', 'sa',
-        'empresa', 'rua', 'avenida', 'centro', 'bairro', 'com', 'br', 'gov'
-    }
-    
+                palavras.update(p for p in texto_normalizado.split() if len(p) >= 2)
+
     # Ponto-chave: O uso de um 'set' remove palavras duplicadas e é eficiente para buscas.
-    return palavras - palavras_comuns
+    return palavras - _STOPWORDS
+
+def _compilar_padrao_palavras(palavras_chave_empresa: Set[str]) -> re.Pattern | None:
+    """
+    Compila as palavras-chave da empresa em uma única alternância de regex.
+    Uma varredura só da descrição substitui o loop 'palavra in descricao'
+    (O(K × |desc|)); o lookahead permite matches sobrepostos em posições
+    diferentes, mas numa mesma posição só a alternativa mais longa casa —
+    palavras sombreadas são reconferidas depois da varredura.
+    """
+    if not palavras_chave_empresa:
+        return None
+
+    alternancia = '|'.join(
+        re.escape(p) for p in sorted(palavras_chave_empresa, key=len, reverse=True)
+    )
+    return re.compile(f'(?=({alternancia}))')
 
 def verificar_correspondencia_descricao(
     palavras_chave_empresa: Set[str],
-    descricao: str
+    descricao: str,
+    padrao: re.Pattern | None = None
 ) -> Tuple[bool, List[str]]:
     """
     Verifica se as palavras-chave da empresa aparecem na descrição do resultado da busca.
     Retorna um booleano para a correspondência e a lista de palavras encontradas.
+    O padrão compilado pode ser reaproveitado entre os resultados de uma mesma empresa.
     """
     if not palavras_chave_empresa or not descricao or pd.isna(descricao):
         return False, []
-        
+
     descricao_norm = normalizar_texto(descricao)
-    palavras_encontradas = [
-        palavra for palavra in palavras_chave_empresa if palavra in descricao_norm
-    ]
-    
+    if padrao is None:
+        padrao = _compilar_padrao_palavras(palavras_chave_empresa)
+    encontradas = set(padrao.findall(descricao_norm))
+
+    # Reconfere as palavras sombreadas pela alternância: uma palavra que é
+    # substring de outra palavra-chave pode só ocorrer dentro do match da
+    # mais longa e escapar do findall ('super' em 'supermercado'). Só essas
+    # candidatas pagam o teste substring original.
+    if len(encontradas) < len(palavras_chave_empresa):
+        for palavra in palavras_chave_empresa:
+            if palavra in encontradas:
+                continue
+            sombreada = any(
+                palavra in outra
+                for outra in palavras_chave_empresa if outra != palavra
+            )
+            if sombreada and palavra in descricao_norm:
+                encontradas.add(palavra)
+
+    palavras_encontradas = list(encontradas)
+
     if not palavras_encontradas:
         return False, []
     
@@ -102,34 +205,43 @@ def buscar_e_validar_perfil(
     # Boa prática: Separar a busca da validação em funções distintas.
     """
     try:
-        # Design robusto: O uso de 'with DDGS(...)' garante o fechamento correto dos recursos.
-        with DDGS(timeout=10) as ddgs:
-            for resultado in ddgs.text(termo_busca, max_results=MAX_RESULTS_PER_SEARCH):
-                url = resultado.get("href", "")
-                if "instagram.com" in url:
-                    # Usa o título e o corpo do resultado da busca para validação
-                    descricao = resultado.get("body", "") + " " + resultado.get("title", "")
-                    
-                    tem_corresp, palavras_encontradas = verificar_correspondencia_descricao(
-                        palavras_chave_empresa, descricao
-                    )
-                    
-                    if tem_corresp:
-                        # Limpa a URL de parâmetros de rastreamento
-                        clean_url = url.split("?")[0]
-                        if clean_url.endswith('/'):
-                            clean_url = clean_url[:-1]
-                        return clean_url, palavras_encontradas
-                        
+        _aguardar_janela()
+        # Compilado uma vez por empresa e reaproveitado nos até
+        # MAX_RESULTS_PER_SEARCH resultados da busca
+        padrao = _compilar_padrao_palavras(palavras_chave_empresa)
+        ddgs = _obter_cliente_ddgs()
+        for resultado in ddgs.text(termo_busca, max_results=MAX_RESULTS_PER_SEARCH):
+            url = resultado.get("href", "")
+            if "instagram.com" in url:
+                # Usa o título e o corpo do resultado da busca para validação
+                descricao = resultado.get("body", "") + " " + resultado.get("title", "")
+
+                tem_corresp, palavras_encontradas = verificar_correspondencia_descricao(
+                    palavras_chave_empresa, descricao, padrao
+                )
+
+                if tem_corresp:
+                    # Limpa a URL de parâmetros de rastreamento
+                    clean_url = url.split("?")[0]
+                    if clean_url.endswith('/'):
+                        clean_url = clean_url[:-1]
+                    return clean_url, palavras_encontradas
+
         return None, []  # Nenhum perfil validado encontrado
     except Exception as e:
+        # Descarta o cliente da thread: na próxima busca um novo é criado
+        _clientes_locais.ddgs = None
         # Imprime o erro no console do servidor para depuração
         print(f"❌ Erro durante a busca por '{termo_busca}': {e}")
         return None, []
 
-def processar_empresa(empresa_dados: pd.Series) -> Dict[str, Any]:
+def processar_empresa(
+    empresa_dados: Dict[str, Any],
+    palavras_chave: Set[str] | None = None
+) -> Dict[str, Any]:
     """
     Orquestra o processo para uma única empresa: extrai palavras-chave, busca e valida.
+    As palavras-chave podem vir pré-computadas do lote para poupar CPU nas threads.
     # Boa prática: Retornar um dicionário estruturado facilita a conversão para DataFrame.
     """
     cnpj = empresa_dados.get('cnpj_basico', '')
@@ -140,12 +252,14 @@ def processar_empresa(empresa_dados: pd.Series) -> Dict[str, Any]:
         return {
             "cnpj_basico": cnpj, "razao_social": razao_social, "municipio": municipio,
             "instagram_url": "Dados insuficientes", "status_validacao": "Falha",
-            "palavras_encontradas": [], "palavras_chave_usadas": []
+            # Strings vazias, como no caminho de sucesso: misturar lista e
+            # string na mesma coluna quebra a serialização Arrow do CSV
+            "palavras_encontradas": "", "palavras_chave_usadas": ""
         }
     
-    palavras_chave = extrair_palavras_chave(empresa_dados)
+    if palavras_chave is None:
+        palavras_chave = extrair_palavras_chave(empresa_dados)
     termo = f'"{razao_social}" {municipio} instagram'
-    time.sleep(TEMPO_ESPERA)
     url_encontrada, palavras_match = buscar_e_validar_perfil(termo, palavras_chave)
     
     status = "Perfil Validado" if url_encontrada else "Nenhum perfil validado"
@@ -161,25 +275,46 @@ def processar_empresa(empresa_dados: pd.Series) -> Dict[str, Any]:
         "palavras_chave_usadas": ", ".join(sorted(list(palavras_chave)))
     }
 
-def buscar_em_lote(empresas_df: pd.DataFrame) -> List[Dict[str, Any]]:
+def buscar_em_lote(
+    empresas_df: pd.DataFrame,
+    max_workers: int = NUM_THREADS,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> List[Dict[str, Any]]:
     """
     Função principal. Usa ThreadPoolExecutor para processar um DataFrame de empresas em paralelo.
     # Ponto-chave da performance: ThreadPoolExecutor para paralelizar as buscas que são limitadas por I/O (rede).
+    # max_workers é exposto na UI; a vazão total continua limitada por BUSCAS_POR_SEGUNDO.
+    # on_result recebe cada resultado assim que fica pronto (ex.: Queue.put),
+    # permitindo que a UI mostre parciais sem esperar o lote terminar.
     """
     resultados = []
     
     # O 'with' garante que todas as threads sejam concluídas antes de sair do bloco.
-    with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
-        # Cria uma "tarefa" para cada linha do DataFrame
+    # SoA: extrai cada coluna para uma lista Python de uma vez (NaN -> None
+    # vetorizado por coluna) e monta os registros com zip. Evita tanto o
+    # iterrows() quanto a cópia integral do frame que o where() global fazia.
+    colunas = list(empresas_df.columns)
+    listas_colunas = []
+    for coluna in colunas:
+        serie = empresas_df[coluna]
+        listas_colunas.append(serie.astype(object).where(serie.notna(), None).tolist())
+    registros = [dict(zip(colunas, valores)) for valores in zip(*listas_colunas)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Palavras-chave pré-computadas no despacho: o trabalho de CPU roda
+        # uma vez (com cache de normalização) e as threads só fazem I/O
         futures = [
-            executor.submit(processar_empresa, row)
-            for index, row in empresas_df.iterrows()
+            executor.submit(processar_empresa, registro, extrair_palavras_chave(registro))
+            for registro in registros
         ]
         
         # Coleta os resultados à medida que ficam prontos
         for future in as_completed(futures):
             try:
-                resultados.append(future.result())
+                resultado = future.result()
+                resultados.append(resultado)
+                if on_result is not None:
+                    on_result(resultado)
             except Exception as e:
                 print(f"❌ Erro ao processar o resultado de uma thread: {e}")
                 
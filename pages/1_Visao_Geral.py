@@ -2,6 +2,12 @@
 import streamlit as st
 import plotly.express as px
 
+from core.database import (
+    carregar_distribuicao_status,
+    carregar_evolucao_mensal,
+    filtros_da_sessao
+)
+
 st.set_page_config(layout="wide", page_title="Visão Geral")
 
 st.title("🏠 Visão Geral")
@@ -12,12 +18,20 @@ if 'df_filtrado' not in st.session_state or st.session_state.df_filtrado.empty:
     st.warning("Nenhum dado encontrado para os filtros selecionados. Por favor, ajuste os filtros na página principal.")
     st.stop()
 
-df = st.session_state.df_filtrado
+# Agregações feitas no banco (GROUP BY): trafega dezenas de linhas,
+# não o DataFrame de até 2M registros
+filtros = filtros_da_sessao()
+df_status = carregar_distribuicao_status(**filtros)
+df_evolucao_mensal = carregar_evolucao_mensal(**filtros)
+
+if df_status.empty or df_evolucao_mensal.empty:
+    st.warning("Não foi possível carregar as agregações no banco de dados.")
+    st.stop()
 
 # --- KPIs Principais ---
 st.subheader("Indicadores Chave")
-total_empresas = len(df)
-empresas_ativas = len(df[df['situacao_cadastral_label'] == 'Ativa'])
+total_empresas = int(df_status['quantidade'].sum())
+empresas_ativas = int(df_status.loc[df_status['situacao_cadastral_label'] == 'Ativa', 'quantidade'].sum())
 percent_ativas = (empresas_ativas / total_empresas * 100) if total_empresas > 0 else 0
 
 col1, col2, col3 = st.columns(3)
@@ -29,19 +43,20 @@ st.markdown("---")
 
 # --- Evolução Temporal ---
 st.subheader("Evolução de Empresas por Ano")
-empresas_por_ano = df['ano_situacao'].value_counts().sort_index()
+empresas_por_ano = df_evolucao_mensal.groupby('ano')['quantidade'].sum()
 st.line_chart(empresas_por_ano)
 
 # --- Aberturas vs. Baixas ---
 st.subheader("Aberturas (Ativas) vs. Baixas por Mês/Ano")
-df_evolucao = df.groupby('mes_ano_situacao')['situacao_cadastral_label'].value_counts().unstack(fill_value=0)
+df_evolucao = df_evolucao_mensal.pivot_table(
+    index='mes_ano', columns='situacao_cadastral_label',
+    values='quantidade', aggfunc='sum', fill_value=0
+)
 
 # Garante que as colunas Ativa e Baixada existam
 if 'Ativa' not in df_evolucao: df_evolucao['Ativa'] = 0
 if 'Baixada' not in df_evolucao: df_evolucao['Baixada'] = 0
 
-df_evolucao.index = df_evolucao.index.to_timestamp()
-
 fig = px.line(df_evolucao, y=['Ativa', 'Baixada'], title="Evolução Mensal de Empresas Ativas vs. Baixadas",
-              labels={'value': 'Quantidade', 'mes_ano_situacao': 'Data'})
-st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+              labels={'value': 'Quantidade', 'mes_ano': 'Data'})
+st.plotly_chart(fig, use_container_width=True)
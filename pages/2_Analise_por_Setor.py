@@ -1,7 +1,16 @@
 # pages/2_📊_Analise_por_Setor.py
 import streamlit as st
+import numpy as np
 import pandas as pd
 
+try:
+    import duckdb
+    TEM_DUCKDB = True
+except ImportError:
+    TEM_DUCKDB = False
+
+from core.database import carregar_top_cnaes, filtros_da_sessao
+
 st.set_page_config(layout="wide", page_title="Análise por Setor (CNAE)")
 
 st.title("📊 Análise por Setor (CNAE)")
@@ -15,15 +24,34 @@ df = st.session_state.df_filtrado
 
 # --- Ranking de CNAEs ---
 st.subheader("Top 15 CNAEs por Número de Empresas")
-top_15_cnaes = df['cnae_fiscal_principal'].value_counts().nlargest(15)
-top_15_cnaes.index = top_15_cnaes.index.astype(str) # Converte para string para gráfico de barras
-st.bar_chart(top_15_cnaes)
+# Agregado no banco: LIMIT 15 em vez de value_counts sobre milhões de linhas
+df_top_cnaes = carregar_top_cnaes(**filtros_da_sessao(), n=15)
+if not df_top_cnaes.empty:
+    top_15_cnaes = df_top_cnaes.set_index(df_top_cnaes['cnae'].astype(str))['quantidade']
+    st.bar_chart(top_15_cnaes)
+else:
+    st.warning("Não foi possível carregar o ranking de CNAEs.")
 
 # --- Evolução por Setor ---
 st.subheader("Evolução de Aberturas para os Setores Filtrados")
 if not st.session_state.cnae_selecionado:
     st.info("Selecione um ou mais CNAEs na barra lateral para ver a evolução específica do setor.")
 else:
-    evolucao_setor = df[df['cnae_fiscal_principal'].isin(st.session_state.cnae_selecionado)]
-    evolucao_setor_chart = evolucao_setor.groupby('ano_situacao')['cnae_fiscal_principal'].value_counts().unstack(fill_value=0)
+    # isin sobre os códigos inteiros da categórica, não sobre as strings
+    cat = df['cnae'].cat
+    codigos_sel = cat.categories.get_indexer(st.session_state.cnae_selecionado)
+    mascara = np.isin(cat.codes.to_numpy(), codigos_sel[codigos_sel >= 0])
+    evolucao_setor = df.loc[mascara, ['ano_situacao', 'cnae']]
+    if TEM_DUCKDB:
+        # Agregação em SQL in-process: o GROUP BY do DuckDB é paralelo e
+        # bem mais rápido que groupby/value_counts do pandas em frames grandes
+        contagem = duckdb.sql(
+            "SELECT ano_situacao, CAST(cnae AS VARCHAR) AS cnae, COUNT(*) AS quantidade "
+            "FROM evolucao_setor GROUP BY 1, 2"
+        ).df()
+        evolucao_setor_chart = contagem.pivot_table(
+            index='ano_situacao', columns='cnae', values='quantidade', fill_value=0
+        )
+    else:
+        evolucao_setor_chart = evolucao_setor.groupby('ano_situacao')['cnae'].value_counts().unstack(fill_value=0)
     st.line_chart(evolucao_setor_chart)
\ No newline at end of file
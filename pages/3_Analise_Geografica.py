@@ -3,6 +3,9 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import json
+import unicodedata
+
+from core.database import carregar_empresas_por_municipio, filtros_da_sessao
 
 st.set_page_config(layout="wide", page_title="Análise Geográfica")
 
@@ -13,8 +16,6 @@ if 'df_filtrado' not in st.session_state or st.session_state.df_filtrado.empty:
     st.warning("Nenhum dado encontrado para os filtros selecionados.")
     st.stop()
 
-df = st.session_state.df_filtrado
-
 # --- Carregar GeoJSON ---
 try:
     with open('dados/municipios_rs.json', 'r', encoding='utf-8') as f:
@@ -25,13 +26,37 @@ except FileNotFoundError:
 
 # --- Mapa Interativo ---
 st.subheader("Distribuição de Empresas por Município no RS")
-empresas_por_municipio = df['municipio'].value_counts().reset_index()
-empresas_por_municipio.columns = ['municipio', 'quantidade']
+# Contagem agregada no banco (GROUP BY municipio), já com nome do município
+empresas_por_municipio = carregar_empresas_por_municipio(**filtros_da_sessao())
+
+if empresas_por_municipio.empty:
+    st.warning("Não foi possível carregar a agregação por município.")
+    st.stop()
+
+def _chave_municipio(nome) -> str:
+    """Chave de comparação de nome de município: sem acentos e casefold.
+    O CSV de lookup traz nomes em caixa alta sem acento ('AGUA SANTA') e o
+    GeoJSON usa o nome oficial acentuado ('Água Santa') — sem normalizar os
+    dois lados, nenhuma feature do mapa casa."""
+    nome = unicodedata.normalize('NFD', str(nome))
+    nome = ''.join(c for c in nome if not unicodedata.combining(c))
+    return nome.casefold().strip()
+
+# Traduz o nome vindo do banco para o nome usado nas features do GeoJSON
+nomes_geojson = {
+    _chave_municipio(feature['properties']['name']): feature['properties']['name']
+    for feature in geojson_rs['features']
+}
+empresas_por_municipio['municipio_geo'] = (
+    empresas_por_municipio['municipio_nome'].astype(str).map(
+        lambda nome: nomes_geojson.get(_chave_municipio(nome))
+    )
+)
 
 fig = px.choropleth_mapbox(
-    empresas_por_municipio,
+    empresas_por_municipio.dropna(subset=['municipio_geo']),
     geojson=geojson_rs,
-    locations='municipio',
+    locations='municipio_geo',
     featureidkey="properties.name", # Chave no GeoJSON que corresponde ao nome do município
     color='quantidade',
     color_continuous_scale="Viridis",
@@ -50,10 +75,10 @@ col1, col2 = st.columns([1, 2])
 
 with col1:
     st.write("**Top 10 Municípios**")
-    top_10_municipios = empresas_por_municipio.head(10)
+    top_10_municipios = empresas_por_municipio.head(10)[['municipio_nome', 'quantidade']]
     st.dataframe(top_10_municipios, hide_index=True)
 
 with col2:
     st.write("**Gráfico do Top 10**")
-    fig_bar = px.bar(top_10_municipios, x='municipio', y='quantidade', text_auto=True)
+    fig_bar = px.bar(top_10_municipios, x='municipio_nome', y='quantidade', text_auto=True)
     st.plotly_chart(fig_bar, use_container_width=True)
\ No newline at end of file
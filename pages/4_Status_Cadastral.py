@@ -2,6 +2,12 @@
 import streamlit as st
 import plotly.express as px
 
+from core.database import (
+    carregar_distribuicao_status,
+    carregar_evolucao_mensal,
+    filtros_da_sessao
+)
+
 st.set_page_config(layout="wide", page_title="Análise de Status Cadastral")
 
 st.title("📋 Análise de Status Cadastral")
@@ -11,20 +17,31 @@ if 'df_filtrado' not in st.session_state or st.session_state.df_filtrado.empty:
     st.warning("Nenhum dado encontrado para os filtros selecionados.")
     st.stop()
 
-df = st.session_state.df_filtrado
+# Agregações no banco: evita value_counts/groupby sobre milhões de linhas
+filtros = filtros_da_sessao()
+df_status = carregar_distribuicao_status(**filtros)
+df_evolucao_mensal = carregar_evolucao_mensal(**filtros)
+
+if df_status.empty or df_evolucao_mensal.empty:
+    st.warning("Não foi possível carregar as agregações no banco de dados.")
+    st.stop()
 
 # --- Distribuição de Status ---
 st.subheader("Distribuição de Empresas por Situação Cadastral")
-status_counts = df['situacao_cadastral_label'].value_counts()
-fig_pie = px.pie(status_counts, values=status_counts.values, names=status_counts.index, 
+fig_pie = px.pie(df_status, values='quantidade', names='situacao_cadastral_label',
                  title="Proporção por Status")
 st.plotly_chart(fig_pie, use_container_width=True)
 
 # --- Evolução do Status ---
 st.subheader("Evolução do Status Cadastral ao Longo do Tempo")
-evolucao_status = df.groupby(['ano_situacao', 'situacao_cadastral_label']).size().reset_index(name='quantidade')
+evolucao_status = (
+    df_evolucao_mensal
+    .groupby(['ano', 'situacao_cadastral_label'], observed=True)['quantidade']
+    .sum()
+    .reset_index()
+)
 
-fig_area = px.area(evolucao_status, x='ano_situacao', y='quantidade', color='situacao_cadastral_label',
+fig_area = px.area(evolucao_status, x='ano', y='quantidade', color='situacao_cadastral_label',
                    title="Quantidade de Empresas por Status a Cada Ano",
-                   labels={'ano_situacao': 'Ano', 'quantidade': 'Número de Empresas'})
-st.plotly_chart(fig_area, use_container_width=True)
\ No newline at end of file
+                   labels={'ano': 'Ano', 'quantidade': 'Número de Empresas'})
+st.plotly_chart(fig_area, use_container_width=True)
@@ -1,10 +1,36 @@
 # pages/5_📄_Relatorios.py
+import atexit
+import os
+import tempfile
+
 import streamlit as st
 import pandas as pd
+import xlsxwriter
 from io import BytesIO
 
 st.set_page_config(layout="wide", page_title="Geração de Relatórios")
 
+# Arquivos xlsx temporários gerados nesta vida do processo, removidos no
+# shutdown — os bytes do relatório ficam em disco, não no heap da sessão.
+# O registro vive atrás de st.cache_resource: o script da página roda de
+# novo a cada rerun, então uma lista no topo do módulo seria recriada (e o
+# atexit registraria um handler novo) a cada visita.
+@st.cache_resource(show_spinner=False)
+def get_arquivos_temp():
+    arquivos = []
+
+    def _limpar():
+        for caminho in arquivos:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+    atexit.register(_limpar)
+    return arquivos
+
+_ARQUIVOS_TEMP = get_arquivos_temp()
+
 st.title("📄 Geração e Download de Relatórios")
 st.markdown("---")
 
@@ -15,12 +41,81 @@ if 'df_filtrado' not in st.session_state or st.session_state.df_filtrado.empty:
 df_relatorio = st.session_state.df_filtrado
 
 # --- Função para converter DataFrame para Excel em memória ---
-def to_excel(df):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Relatorio')
-    processed_data = output.getvalue()
-    return processed_data
+def fingerprint_df(df: pd.DataFrame) -> tuple:
+    """Assinatura barata do frame filtrado, sem hashear o DataFrame inteiro.
+    Usa a chave de conteúdo calculada no app principal quando existir (ela
+    também endereça o artefato Parquet em /tmp); caso contrário cai no
+    resumo tamanho + colunas + hash do índice."""
+    chave = st.session_state.get('df_filtrado_key')
+    if chave:
+        return (chave,)
+    return (len(df), tuple(df.columns), int(pd.util.hash_pandas_object(df.index).sum()))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def previa_relatorio(fingerprint: tuple, _df: pd.DataFrame) -> pd.DataFrame:
+    """Fatia de pré-visualização memoizada por filtro: o frame pequeno já
+    fica pronto (e desacoplado do original) para os reruns da página."""
+    return _df.head(10).copy()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def to_csv(fingerprint: tuple, _df: pd.DataFrame) -> bytes:
+    return _df.to_csv(index=False).encode('utf-8')
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def to_parquet_bytes(fingerprint: tuple, _df: pd.DataFrame) -> bytes:
+    df = _df
+    # Arrow não tem dtype Period: converte essas colunas para texto antes
+    colunas_period = [c for c in df.columns if isinstance(df[c].dtype, pd.PeriodDtype)]
+    if colunas_period:
+        df = df.assign(**{c: df[c].astype(str) for c in colunas_period})
+    buf = BytesIO()
+    df.to_parquet(buf, engine='pyarrow', compression='zstd')
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def to_excel_path(fingerprint: tuple, _df: pd.DataFrame) -> str:
+    # O underscore em _df pula o hash do frame; o fingerprint identifica o
+    # resultado, então o xlsx só é re-serializado quando os filtros mudam.
+    # O workbook vai para um arquivo temporário em modo constant_memory:
+    # nem o blob final nem as linhas acumuladas passam pelo heap do Python
+    tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', prefix='relatorio_rfb_', delete=False)
+    tmp.close()
+    opcoes = {
+        'constant_memory': True,
+        'strings_to_urls': False,
+        'nan_inf_to_errors': True,
+        'use_zip64': True,  # planilhas grandes podem passar dos limites do zip clássico
+    }
+    # Staging do constant_memory em tmpfs quando disponível: as linhas em
+    # trânsito ficam em RAM em vez de disco, acelerando a finalização do zip
+    if os.path.isdir('/dev/shm'):
+        opcoes['tmpdir'] = '/dev/shm'
+    workbook = xlsxwriter.Workbook(tmp.name, opcoes)
+    worksheet = workbook.add_worksheet('Relatorio')
+    worksheet.write_row(0, 0, [str(coluna) for coluna in _df.columns])
+
+    # Valores extraídos coluna a coluna (sem o ExcelFormatter do pandas)...
+    colunas_valores = []
+    for coluna in _df.columns:
+        serie = _df[coluna]
+        if pd.api.types.is_numeric_dtype(serie):
+            colunas_valores.append(serie.tolist())
+        elif pd.api.types.is_datetime64_any_dtype(serie):
+            # ISO pré-formatado de uma vez na coluna: pula o
+            # _convert_date_time por célula do xlsxwriter
+            colunas_valores.append(serie.dt.strftime('%Y-%m-%d').fillna('').tolist())
+        else:
+            # categóricas/Period viram texto — evita exigir formatos
+            # de célula do Excel (que reativariam o caminho por célula)
+            colunas_valores.append(serie.astype(str).tolist())
+
+    # ...e escritos em ordem de linha, como o constant_memory exige
+    for i, linha in enumerate(zip(*colunas_valores), start=1):
+        worksheet.write_row(i, 0, linha)
+    workbook.close()
+
+    _ARQUIVOS_TEMP.append(tmp.name)
+    return tmp.name
 
 # --- Interface de Geração ---
 st.subheader("Relatório Personalizado com Filtros Atuais")
@@ -36,19 +131,47 @@ with st.expander("Ver Filtros Ativos", expanded=False):
 st.metric("Total de Linhas no Relatório", f"{len(df_relatorio):,}")
 
 st.markdown("### Pré-visualização do Relatório")
-st.dataframe(df_relatorio.head(10))
+st.dataframe(previa_relatorio(fingerprint_df(df_relatorio), df_relatorio))
 
 # --- Botão de Geração e Download ---
 st.markdown("---")
 st.subheader("Download do Relatório Completo")
 
-# Gera o arquivo Excel em memória
-excel_data = to_excel(df_relatorio)
+# CSV é o caminho rápido padrão (serialização ~dezenas de vezes mais barata
+# que xlsx); Parquet para quem consome os dados em ferramenta analítica;
+# Excel fica como opt-in atrás do botão de geração
+formato = st.radio("Formato do arquivo", ["CSV", "Parquet", "Excel"], horizontal=True)
+
+if formato == "CSV":
+    st.download_button(
+        label="📥 Baixar Relatório em CSV",
+        data=to_csv(fingerprint_df(df_relatorio), df_relatorio),
+        file_name="relatorio_empresas_filtrado.csv",
+        mime="text/csv"
+    )
+elif formato == "Parquet":
+    st.download_button(
+        label="📥 Baixar Relatório em Parquet",
+        data=to_parquet_bytes(fingerprint_df(df_relatorio), df_relatorio),
+        file_name="relatorio_empresas_filtrado.parquet",
+        mime="application/octet-stream"
+    )
+else:
+    st.info("⏳ A geração do Excel é bem mais lenta que CSV/Parquet para relatórios grandes.")
+    # Geração em duas etapas: o xlsx só é construído depois do clique em
+    # "Gerar Excel" — visitas que apenas pré-visualizam não pagam o xlsxwriter
+    if st.button("⚙️ Gerar Excel"):
+        st.session_state['excel_path'] = to_excel_path(fingerprint_df(df_relatorio), df_relatorio)
 
-# Cria o botão de download
-st.download_button(
-    label="📥 Baixar Relatório em Excel",
-    data=excel_data,
-    file_name="relatorio_empresas_filtrado.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
\ No newline at end of file
+    # Cria o botão de download quando o arquivo já foi gerado; os bytes são
+    # lidos do arquivo temporário num bloco with, sem cópia no session_state
+    # nem descritor aberto sobrando a cada rerun
+    if st.session_state.get('excel_path') and os.path.exists(st.session_state['excel_path']):
+        with open(st.session_state['excel_path'], 'rb') as arquivo_excel:
+            dados_excel = arquivo_excel.read()
+        st.download_button(
+            label="📥 Baixar Relatório em Excel",
+            data=dados_excel,
+            file_name="relatorio_empresas_filtrado.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
\ No newline at end of file
@@ -1,24 +1,92 @@
 # pages/6_🤖_Buscador_Instagram.py
+import queue
+import time
+import uuid
+
 import streamlit as st
 import pandas as pd
-from threading import Thread
-from core.search import buscar_em_lote # Importa a função do arquivo em core/
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from concurrent.futures import ThreadPoolExecutor
+from core.search import buscar_em_lote, CAMPOS_BUSCA, NUM_THREADS # Importa do arquivo em core/
 
 st.set_page_config(layout="wide", page_title="Buscador de Instagram")
 
+# Recursos compartilhados do processo via st.cache_resource: scripts de
+# página são re-executados a cada rerun, então objetos criados no topo do
+# arquivo não sobreviveriam — os singletons abaixo persistem entre reruns e
+# sessões. O worker não toca o session_state (mutação fora do ScriptRunner é
+# comportamento indefinido); a sessão guarda apenas o id do seu job.
+
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    """Pool de threads único do processo para os jobs de scraping."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix='scraper')
+
+@st.cache_resource(show_spinner=False)
+def get_jobs():
+    """Registro de (Future, instante de submissão) por id de job."""
+    return {}
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """Cache de lotes concluídos, keyed pela tupla ordenada de CNPJs."""
+    return {}
+
+EXECUTOR = get_executor()
+JOBS = get_jobs()
+
 # Inicializa as variáveis de estado da sessão para esta página
-if 'scraping_in_progress' not in st.session_state:
-    st.session_state.scraping_in_progress = False
+if 'scraping_job_id' not in st.session_state:
+    st.session_state.scraping_job_id = None
 if 'scraping_results' not in st.session_state:
     st.session_state.scraping_results = None
-if 'scraping_thread' not in st.session_state:
-    st.session_state.scraping_thread = None
+if 'results_queue' not in st.session_state:
+    st.session_state.results_queue = None
+if 'scraping_parciais' not in st.session_state:
+    st.session_state.scraping_parciais = []
+if 'scraping_total' not in st.session_state:
+    st.session_state.scraping_total = 0
+
+# Poda jobs concluídos cuja sessão nunca voltou para colher o resultado
+# (aba fechada no meio da busca): sem isso o registro global acumularia
+# Futures — cada um segurando o DataFrame de resultados — para sempre.
+# A carência dá folga de sobra para o rerun de 2s da sessão dona, e o
+# lote segue recuperável pelo RESULT_CACHE.
+JOBS_TTL_SEGUNDOS = 600
+for jid, (future_job, inicio) in list(JOBS.items()):
+    if jid == st.session_state.scraping_job_id:
+        continue
+    if future_job.done() and time.time() - inicio > JOBS_TTL_SEGUNDOS:
+        JOBS.pop(jid, None)
+
+# Cache dos lotes já buscados. st.cache_data não serve aqui: o resultado
+# nasce na thread de background, sem contexto de script do Streamlit para
+# popular o cache — por isso o dict singleton via cache_resource.
+RESULT_CACHE = get_result_cache()
+RESULT_CACHE_MAX = 32
+
+def chave_lote(df_para_buscar):
+    """Chave estável do lote: os CNPJs ordenados, independente da ordem das linhas."""
+    return tuple(sorted(df_para_buscar['cnpj_basico'].astype(str).unique()))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def resultados_para_csv(fingerprint: tuple, _df: pd.DataFrame) -> bytes:
+    """Serializa os resultados em CSV via pyarrow: uma passada direto para
+    bytes, sem montar a string Python intermediária do to_csv."""
+    buf = pa.BufferOutputStream()
+    pacsv.write_csv(pa.Table.from_pandas(_df, preserve_index=False), buf)
+    return buf.getvalue().to_pybytes()
 
-def run_scraping_thread(df_para_buscar):
-    """Função que será executada na thread para não bloquear a UI."""
-    resultados = buscar_em_lote(df_para_buscar)
-    st.session_state.scraping_results = pd.DataFrame(resultados)
-    st.session_state.scraping_in_progress = False # Sinaliza o fim do processo
+def run_scraping_job(df_para_buscar, max_workers, fila, chave_cache):
+    """Job executado no EXECUTOR. Só toca objetos do módulo (fila e cache);
+    o resultado volta para a sessão via Future.result() no script principal."""
+    resultados = buscar_em_lote(df_para_buscar, max_workers=max_workers, on_result=fila.put)
+    df_resultados = pd.DataFrame(resultados)
+    if len(RESULT_CACHE) >= RESULT_CACHE_MAX:
+        RESULT_CACHE.pop(next(iter(RESULT_CACHE)))  # descarta o lote mais antigo
+    RESULT_CACHE[chave_cache] = df_resultados
+    return df_resultados
 
 st.title("🤖 Buscador de Perfis do Instagram")
 st.markdown("---")
@@ -35,43 +103,125 @@ if 'df_filtrado' not in st.session_state or st.session_state.df_filtrado.empty:
 df_selecionado = st.session_state.df_filtrado
 st.info(f"**{len(df_selecionado):,}** empresas foram selecionadas com base nos filtros globais. Estas empresas serão usadas para a busca.")
 
+# Estado do job desta sessão
+job_id = st.session_state.scraping_job_id
+entrada_job = JOBS.get(job_id) if job_id else None
+job = entrada_job[0] if entrada_job else None
+em_andamento = job is not None and not job.done()
+
+# Job terminou desde o último rerun: colhe o resultado e libera o registro
+if job is not None and job.done():
+    try:
+        st.session_state.scraping_results = job.result()
+    except Exception as e:
+        st.error(f"❌ Erro durante a busca em lote: {e}")
+    JOBS.pop(job_id, None)
+    st.session_state.scraping_job_id = None
+
 st.subheader("1. Inicie a Busca em Background")
 st.markdown("Ao clicar no botão, a busca será iniciada. Você pode continuar navegando no dashboard. Os resultados aparecerão abaixo quando a busca for concluída.")
 
+# Teto obrigatório de empresas por lote: um filtro descuidado com 200k
+# linhas viraria 200k requisições. A amostra usa random_state fixo para que
+# repetir a execução gere o mesmo conjunto de CNPJs e acerte o cache.
+limite_empresas = st.number_input(
+    "Máx. de empresas por busca", min_value=1, max_value=5000, value=500,
+    disabled=em_andamento
+)
+
+# Paralelismo ajustável: buscas são I/O-bound, então mais workers ajudam até
+# o teto de requisições por segundo do limitador em core/search.py
+max_workers = st.slider(
+    "Buscas em paralelo", min_value=1, max_value=64, value=NUM_THREADS,
+    disabled=em_andamento
+)
+
 col1, col2 = st.columns(2)
 with col1:
-    start_button_disabled = st.session_state.scraping_in_progress
-    if st.button("🚀 Iniciar Busca dos Perfis", type="primary", disabled=start_button_disabled, use_container_width=True):
-        st.session_state.scraping_in_progress = True
-        st.session_state.scraping_results = None
+    if st.button("🚀 Iniciar Busca dos Perfis", type="primary", disabled=em_andamento, use_container_width=True):
+        df_lote = df_selecionado.sample(
+            n=min(int(limite_empresas), len(df_selecionado)), random_state=42
+        )
+        chave = chave_lote(df_lote)
+        if chave in RESULT_CACHE:
+            # Mesmo conjunto de empresas já buscado: devolve sem tocar a rede
+            st.session_state.scraping_results = RESULT_CACHE[chave]
+        else:
+            st.session_state.scraping_results = None
+            st.session_state.results_queue = queue.Queue()
+            st.session_state.scraping_parciais = []
+            st.session_state.scraping_total = len(df_lote)
 
-        thread = Thread(target=run_scraping_thread, args=(df_selecionado.copy(),))
-        st.session_state.scraping_thread = thread
-        thread.start()
+            # Projeta só as colunas que o scraper lê: nada de copiar o frame
+            # inteiro (o worker não muta o DataFrame da sessão)
+            colunas_busca = [c for c in CAMPOS_BUSCA if c in df_lote.columns]
+            novo_id = str(uuid.uuid4())
+            JOBS[novo_id] = (
+                EXECUTOR.submit(
+                    run_scraping_job, df_lote[colunas_busca], max_workers,
+                    st.session_state.results_queue, chave
+                ),
+                time.time(),
+            )
+            st.session_state.scraping_job_id = novo_id
         st.rerun()
 
 with col2:
-    if st.button("🧹 Limpar Resultados", disabled=(not st.session_state.scraping_in_progress and st.session_state.scraping_results is None), use_container_width=True):
-        st.session_state.scraping_in_progress = False
+    if st.button("🧹 Limpar Resultados", disabled=(not em_andamento and st.session_state.scraping_results is None), use_container_width=True):
+        if job_id:
+            JOBS.pop(job_id, None)
+        st.session_state.scraping_job_id = None
         st.session_state.scraping_results = None
-        st.session_state.scraping_thread = None
+        st.session_state.results_queue = None
+        st.session_state.scraping_parciais = []
+        st.session_state.scraping_total = 0
         st.rerun()
 
 st.markdown("---")
 st.subheader("2. Acompanhe e Exporte os Resultados")
 
-if st.session_state.scraping_in_progress:
-    st.info("🔄 Busca em andamento... Por favor, aguarde. A interface permanecerá responsiva.")
-    st.spinner("Processando...")
+if em_andamento:
+    # Drena a fila alimentada pelo job de busca e acumula os parciais
+    fila = st.session_state.results_queue
+    if fila is not None:
+        while True:
+            try:
+                st.session_state.scraping_parciais.append(fila.get_nowait())
+            except queue.Empty:
+                break
+
+    # Barra de progresso real: cada resultado drenado da fila conta como
+    # uma empresa concluída — nada de spinner decorativo
+    concluidas = len(st.session_state.scraping_parciais)
+    total = st.session_state.scraping_total or 1
+    st.progress(
+        min(concluidas / total, 1.0),
+        text=f"🔄 {concluidas:,} de {total:,} empresas processadas"
+    )
+
+    placeholder = st.empty()
+    if st.session_state.scraping_parciais:
+        placeholder.dataframe(
+            pd.DataFrame(st.session_state.scraping_parciais), use_container_width=True
+        )
+
+    # Agenda o próximo poll da fila sem travar a busca em background
+    time.sleep(2)
+    st.rerun()
 
 elif st.session_state.scraping_results is not None:
     df_resultados = st.session_state.scraping_results
-    perfis_validados = len(df_resultados[df_resultados['status_validacao'] == 'Perfil Validado'])
+    perfis_validados = int((df_resultados['status_validacao'] == 'Perfil Validado').sum())
 
     st.success(f"✅ Busca concluída! {perfis_validados} perfis foram encontrados e validados de um total de {len(df_resultados)} empresas processadas.")
     st.dataframe(df_resultados, use_container_width=True)
 
-    csv = df_resultados.to_csv(index=False).encode('utf-8')
+    fingerprint = (
+        len(df_resultados),
+        tuple(df_resultados.columns),
+        int(pd.util.hash_pandas_object(df_resultados['cnpj_basico']).sum()),
+    )
+    csv = resultados_para_csv(fingerprint, df_resultados)
     st.download_button(
         label="📥 Baixar Resultados em CSV",
         data=csv,
@@ -79,4 +229,4 @@ elif st.session_state.scraping_results is not None:
         mime="text/csv",
     )
 else:
-    st.info("Aguardando o início da busca. Os resultados aparecerão aqui.")
\ No newline at end of file
+    st.info("Aguardando o início da busca. Os resultados aparecerão aqui.")
@@ -0,0 +1,48 @@
+-- ============================================================================
+-- SCRIPT DE COLUNA GERADA DATE PARA data_situacao_cadastral
+-- ============================================================================
+--
+-- data_situacao_cadastral é armazenada como YYYYMMDD "texto-ish", o que
+-- obriga as queries a castear (::text) e a validar com regex linha a linha.
+-- Esta migração materializa uma coluna DATE gerada + índice btree, para que
+-- o filtro de período vire um BETWEEN indexado com objetos date nativos.
+--
+-- COMO EXECUTAR:
+--   psql -U felipe -d cnpj_db2 -f scripts/add_data_situacao_date.sql
+--
+-- ============================================================================
+
+-- Conectar ao banco correto
+\c cnpj_db2
+
+-- ============================================================================
+-- 1. COLUNA GERADA (DATE)
+-- ============================================================================
+
+ALTER TABLE public.estabelecimentos
+ADD COLUMN IF NOT EXISTS data_situacao_date DATE GENERATED ALWAYS AS (
+    CASE
+        WHEN data_situacao_cadastral::text ~ '^[0-9]{8}$'
+        THEN to_date(data_situacao_cadastral::text, 'YYYYMMDD')
+    END
+) STORED;
+
+-- ============================================================================
+-- 2. ÍNDICE PARA O BETWEEN DE PERÍODO
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_estabelecimentos_data_situacao_date
+ON public.estabelecimentos (data_situacao_date);
+
+-- ============================================================================
+-- 3. ATUALIZAR ESTATÍSTICAS
+-- ============================================================================
+
+ANALYZE public.estabelecimentos;
+
+-- ============================================================================
+-- FIM DO SCRIPT
+-- ============================================================================
+
+\echo '✅ Coluna data_situacao_date criada e indexada!'
+\echo '⚡ Filtros de período deixam de pagar regex/cast por linha.'
@@ -0,0 +1,77 @@
+-- ============================================================================
+-- SCRIPT DE MATERIALIZED VIEWS PARA AS OPÇÕES DE FILTRO DO DASHBOARD
+-- ============================================================================
+--
+-- carregar_opcoes_filtros roda SELECT DISTINCT sobre a tabela de fatos a
+-- cada expiração de cache para popular os dropdowns. Esses conjuntos mudam
+-- só quando a carga da RFB é atualizada, então viram MVs pequenas (~5k
+-- linhas) lidas em sub-ms, com refresh agendado junto da carga.
+--
+-- COMO EXECUTAR:
+--   psql -U felipe -d cnpj_db2 -f scripts/create_filter_options_mvs.sql
+--
+-- REFRESH (após cada carga, ou via pg_cron):
+--   REFRESH MATERIALIZED VIEW CONCURRENTLY public.mv_filtro_municipios_rs;
+--   REFRESH MATERIALIZED VIEW CONCURRENTLY public.mv_filtro_cnaes_rs;
+--   REFRESH MATERIALIZED VIEW public.mv_filtro_datas_rs;
+--
+-- ============================================================================
+
+-- Conectar ao banco correto
+\c cnpj_db2
+
+-- ============================================================================
+-- 1. MUNICÍPIOS DISTINTOS (RS + ATIVA)
+-- ============================================================================
+
+DROP MATERIALIZED VIEW IF EXISTS public.mv_filtro_municipios_rs CASCADE;
+
+CREATE MATERIALIZED VIEW public.mv_filtro_municipios_rs AS
+SELECT DISTINCT municipio
+FROM public.estabelecimentos
+WHERE uf = 'RS' AND situacao_cadastral = 2
+  AND municipio IS NOT NULL;
+
+-- Índice único exigido pelo REFRESH CONCURRENTLY
+CREATE UNIQUE INDEX idx_mv_filtro_municipios_rs
+ON public.mv_filtro_municipios_rs(municipio);
+
+-- ============================================================================
+-- 2. CNAES DISTINTOS (RS + ATIVA)
+-- ============================================================================
+
+DROP MATERIALIZED VIEW IF EXISTS public.mv_filtro_cnaes_rs CASCADE;
+
+CREATE MATERIALIZED VIEW public.mv_filtro_cnaes_rs AS
+SELECT DISTINCT ec.cnae
+FROM public.estabelecimento_cnaes ec
+INNER JOIN public.estabelecimentos e ON ec.cnpj = e.cnpj
+WHERE e.uf = 'RS' AND e.situacao_cadastral = 2
+  AND ec.cnae IS NOT NULL;
+
+CREATE UNIQUE INDEX idx_mv_filtro_cnaes_rs
+ON public.mv_filtro_cnaes_rs(cnae);
+
+-- ============================================================================
+-- 3. PERÍODO DISPONÍVEL (MIN/MAX DE data_situacao_cadastral)
+-- ============================================================================
+
+DROP MATERIALIZED VIEW IF EXISTS public.mv_filtro_datas_rs CASCADE;
+
+CREATE MATERIALIZED VIEW public.mv_filtro_datas_rs AS
+SELECT
+    MIN(data_situacao_cadastral::text) AS min_data,
+    MAX(data_situacao_cadastral::text) AS max_data,
+    NOW() AS atualizado_em
+FROM public.estabelecimentos
+WHERE uf = 'RS' AND situacao_cadastral = 2
+  AND data_situacao_cadastral IS NOT NULL
+  AND LENGTH(data_situacao_cadastral::text) = 8
+  AND data_situacao_cadastral::text ~ '^[0-9]{8}$';
+
+-- ============================================================================
+-- FIM DO SCRIPT
+-- ============================================================================
+
+\echo '✅ Materialized views das opções de filtro criadas!'
+\echo '⚡ Os dropdowns passam a ler MVs pequenas em vez de DISTINCT na tabela de fatos.'
@@ -0,0 +1,51 @@
+-- ============================================================================
+-- SCRIPT DE ÍNDICES COMPOSTOS PARA OS FILTROS DO DASHBOARD
+-- ============================================================================
+--
+-- As queries quentes de core/database.py filtram sempre por
+-- (uf = 'RS', situacao_cadastral = 2) e, opcionalmente, por município e
+-- data_situacao_cadastral. Sem um índice composto alinhado a esse predicado,
+-- o Postgres varre a tabela estabelecimentos inteira a cada consulta.
+--
+-- COMO EXECUTAR:
+--   psql -U felipe -d cnpj_db2 -f scripts/create_indexes_filtros.sql
+--
+-- OBS: CREATE INDEX CONCURRENTLY não bloqueia escritas, mas não pode rodar
+-- dentro de transação — execute com autocommit (padrão do psql).
+--
+-- ============================================================================
+
+-- Conectar ao banco correto
+\c cnpj_db2
+
+-- ============================================================================
+-- 1. ÍNDICE PARCIAL PARA O FILTRO PADRÃO (RS + ATIVA)
+-- ============================================================================
+
+-- Parcial porque uf/situação são constantes em todas as queries do app:
+-- o índice cobre só as linhas que o dashboard de fato lê.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_estab_rs_ativa
+ON public.estabelecimentos (municipio, data_situacao_cadastral)
+WHERE uf = 'RS' AND situacao_cadastral = 2;
+
+-- ============================================================================
+-- 2. ÍNDICE COBRINDO O JOIN COM CNAES
+-- ============================================================================
+
+-- INCLUDE evita o heap fetch durante o JOIN estabelecimentos ⋈ cnaes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_estab_cnaes_cnpj_incl
+ON public.estabelecimento_cnaes (cnpj) INCLUDE (cnae);
+
+-- ============================================================================
+-- 3. ATUALIZAR ESTATÍSTICAS
+-- ============================================================================
+
+ANALYZE public.estabelecimentos;
+ANALYZE public.estabelecimento_cnaes;
+
+-- ============================================================================
+-- FIM DO SCRIPT
+-- ============================================================================
+
+\echo '✅ Índices compostos dos filtros criados!'
+\echo '⚡ As queries do dashboard passam a usar index scans no predicado RS/Ativa.'
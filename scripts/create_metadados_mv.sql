@@ -0,0 +1,50 @@
+-- ============================================================================
+-- SCRIPT DE MATERIALIZED VIEW PARA OS METADADOS DO DASHBOARD
+-- ============================================================================
+--
+-- obter_metadados roda em todo carregamento de página e pagava um hash join
+-- estabelecimento_cnaes ⋈ estabelecimentos inteiro só para produzir
+-- COUNT(DISTINCT cnae). Esta MV pré-computa os três contadores (registros,
+-- municípios e CNAEs distintos no recorte RS/Ativa) em uma linha única,
+-- reduzindo a chamada a um SELECT O(1).
+--
+-- COMO EXECUTAR:
+--   psql -U felipe -d cnpj_db2 -f scripts/create_metadados_mv.sql
+--
+-- REFRESH (após cada carga, ou via pg_cron):
+--   REFRESH MATERIALIZED VIEW public.mv_metadados_rs;
+--
+-- ============================================================================
+
+-- Conectar ao banco correto
+\c cnpj_db2
+
+-- ============================================================================
+-- 1. MATERIALIZED VIEW DE METADADOS (RS + ATIVA)
+-- ============================================================================
+
+DROP MATERIALIZED VIEW IF EXISTS public.mv_metadados_rs CASCADE;
+
+CREATE MATERIALIZED VIEW public.mv_metadados_rs AS
+SELECT
+    (SELECT COUNT(*)
+     FROM public.estabelecimentos
+     WHERE uf = 'RS' AND situacao_cadastral = 2) AS total_registros,
+
+    (SELECT COUNT(DISTINCT municipio)
+     FROM public.estabelecimentos
+     WHERE uf = 'RS' AND situacao_cadastral = 2) AS total_municipios,
+
+    (SELECT COUNT(DISTINCT ec.cnae)
+     FROM public.estabelecimento_cnaes ec
+     INNER JOIN public.estabelecimentos e ON ec.cnpj = e.cnpj
+     WHERE e.uf = 'RS' AND e.situacao_cadastral = 2) AS total_cnaes,
+
+    NOW() AS atualizado_em;
+
+-- ============================================================================
+-- FIM DO SCRIPT
+-- ============================================================================
+
+\echo '✅ Materialized view de metadados criada!'
+\echo '⚡ obter_metadados vira um SELECT de linha única, sem COUNT(DISTINCT) por página.'
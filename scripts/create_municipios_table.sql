@@ -0,0 +1,53 @@
+-- ============================================================================
+-- SCRIPT DE CRIAÇÃO DA TABELA DE MUNICÍPIOS
+-- ============================================================================
+--
+-- Cria a tabela de lookup codigo -> nome de município e a popula a partir
+-- do CSV do projeto (dados/municipios.csv). Com a tabela presente, as
+-- queries em core/database.py fazem o JOIN no banco e o dashboard deixa de
+-- mapear código -> nome linha a linha no pandas.
+--
+-- COMO EXECUTAR (na raiz do repositório):
+--   psql -U felipe -d cnpj_db2 -f scripts/create_municipios_table.sql
+--
+-- ============================================================================
+
+-- Conectar ao banco correto
+\c cnpj_db2
+
+-- ============================================================================
+-- 1. TABELA DE MUNICÍPIOS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.municipios (
+    codigo INTEGER PRIMARY KEY,
+    nome   TEXT NOT NULL
+);
+
+-- ============================================================================
+-- 2. CARGA A PARTIR DO CSV (códigos com zeros à esquerda viram INTEGER)
+-- ============================================================================
+
+CREATE TEMP TABLE municipios_stage (codigo TEXT, nome TEXT);
+
+\copy municipios_stage FROM 'dados/municipios.csv' WITH (FORMAT csv, DELIMITER ';')
+
+INSERT INTO public.municipios (codigo, nome)
+SELECT codigo::int, nome
+FROM municipios_stage
+ON CONFLICT (codigo) DO UPDATE SET nome = EXCLUDED.nome;
+
+DROP TABLE municipios_stage;
+
+-- ============================================================================
+-- 3. ATUALIZAR ESTATÍSTICAS
+-- ============================================================================
+
+ANALYZE public.municipios;
+
+-- ============================================================================
+-- FIM DO SCRIPT
+-- ============================================================================
+
+\echo '✅ Tabela public.municipios criada e populada!'
+\echo '⚡ O mapeamento código -> nome agora é um JOIN indexado no banco.'